@@ -1,252 +1,1243 @@
 import json
 import http.server
+from http import HTTPStatus
+import asyncio
 import os
 from dotenv import load_dotenv
 from http.server import HTTPServer
 from socketserver import ThreadingMixIn
 from contextlib import contextmanager
-from threading import Lock,Thread
+from threading import Lock,Thread,Condition,Event
 import csv
 import socket
 from concurrent.futures import ThreadPoolExecutor
 import multiprocessing
-import pandas as pd
 import time
+import bisect
+import heapq
+import mmap
+import struct
+import re
+import zlib
+import uuid
+import itertools
+import collections
 import requests
-import warnings
-
-# Suppress the specific warning about Pyarrow not being installed
-warnings.simplefilter("ignore", category=DeprecationWarning)
+from urllib.parse import parse_qs,urlparse
 
 # Load environment variables from .env file
 load_dotenv()
 
-class RWLock(object):
-    """RWLock class based on https://gist.github.com/tylerneylon/a7ff6017b7a1f9a506cf75aa23eacfd6
+class StripedLock(object):
+    """Fixed set of locks shared by all toys, each toy name hashes to one stripe.
     Usage:
-        my_obj_rwlock = RWLock()
+        locks = StripedLock(64)
+
+        # When reading or changing one toy:
+        with locks.locked(toy_name):
+            check_and_decrement(toy_name)
 
-        # When reading from my_obj:
-        with my_obj_rwlock.r_locked():
-            do_read_only_things_with(my_obj)
+        # When reading or changing several toys at once:
+        with locks.many_locked(toy_names):
+            ...
 
-        # When writing to my_obj:
-        with my_obj_rwlock.w_locked():
-            mutate(my_obj)
+        # When a consistent view of the whole catalog is needed:
+        with locks.all_locked():
+            copy_or_mutate_catalog()
     """
 
-    def __init__(self):
-        self.w_lock = Lock()
-        self.num_r_lock = Lock()
-        self.num_r = 0
-
-    # _______________________
-    # Reading methods.
-    def r_acquire(self):
-        self.num_r_lock.acquire()
-        self.num_r += 1
-        if self.num_r == 1:
-            self.w_lock.acquire()
-        self.num_r_lock.release()
-
-    def r_release(self):
-        assert self.num_r > 0
-        self.num_r_lock.acquire()
-        self.num_r -= 1
-        if self.num_r == 0:
-            self.w_lock.release()
-        self.num_r_lock.release()
+    def __init__(self, stripes=64):
+        self.locks = [Lock() for _ in range(stripes)]
+
+    def stripe(self, key):
+        return hash(key) % len(self.locks)
 
     @contextmanager
-    def r_locked(self):
-        self.r_acquire()
+    def locked(self, key):
+        lock = self.locks[self.stripe(key)]
+        lock.acquire()
         try:
             yield
         finally:
-            self.r_release()
-
-    # _______________________
-    # Writing methods.
+            lock.release()
 
-    def w_acquire(self):
-        self.w_lock.acquire()
-
-    def w_release(self):
-        self.w_lock.release()
+    # Stripes are always taken in index order, so threads locking several stripes cannot deadlock
+    @contextmanager
+    def many_locked(self, keys):
+        stripes = sorted({self.stripe(key) for key in keys})
+        for stripe in stripes:
+            self.locks[stripe].acquire()
+        try:
+            yield
+        finally:
+            for stripe in reversed(stripes):
+                self.locks[stripe].release()
 
     @contextmanager
-    def w_locked(self):
-        self.w_acquire()
+    def all_locked(self):
+        for lock in self.locks:
+            lock.acquire()
         try:
             yield
         finally:
-            self.w_release()
+            for lock in reversed(self.locks):
+                lock.release()
+
+
+class InventoryJournal(object):
+    """Append-only journal of catalog changes.
+    Every change is written as one "toy,quantity,price" line holding the new state of the toy,
+    so replaying the journal over the last snapshot (later lines win) rebuilds the catalog.
+    Before a snapshot is written the journal is rotated to "<journal>.old", which is removed
+    once the snapshot is safely on disk.
+
+    In group-commit mode appended records are buffered and a committer thread writes and fsyncs
+    everything that arrived within the commit window (or up to the batch size) in one go.
+    Callers wait with wait_durable() until the batch holding their record is on disk.
+    """
+
+    def __init__(self, journal_file, group_commit=False, window=0.002, batch_size=64):
+        self.journal_file = journal_file
+        self.rotated_file = f"{journal_file}.old"
+        self.lock = Lock()
+        # Serializes writes to the journal file between the committer thread and rotate()
+        self.io_lock = Lock()
+        self.file = None
+        # Set once the catalog has been recovered and the journal is open for appends
+        self.opened = Event()
+        # Number of records appended since the last rotation
+        self.pending = 0
+
+        self.group_commit = group_commit
+        self.window = window
+        self.batch_size = batch_size
+        self.buffer = []
+        # Ticket of the last appended record and of the last record known to be on disk
+        self.appended = 0
+        self.durable = 0
+        self.appended_cond = Condition(self.lock)
+        self.durable_cond = Condition(self.lock)
+        if self.group_commit:
+            self.commit_thread = Thread(target=self.commit_thread_loop)
+            self.commit_thread.daemon = True
+            self.commit_thread.start()
+
+    def open(self):
+        with self.io_lock:
+            self.file = open(self.journal_file, "a", newline="")
+            self.writer = csv.writer(self.file)
+        self.opened.set()
+
+    # Append a record and return its ticket for wait_durable()
+    def append(self, toy, quantity, price):
+        return self.append_many([[toy, quantity, price]])
+
+    # Append several records with a single write and return the ticket of the last one
+    def append_many(self, rows):
+        if self.group_commit:
+            with self.lock:
+                self.buffer.extend(rows)
+                self.appended += len(rows)
+                self.pending += len(rows)
+                self.appended_cond.notify()
+                return self.appended
+
+        with self.io_lock:
+            self.writer.writerows(rows)
+            self.file.flush()
+        with self.lock:
+            self.appended += len(rows)
+            self.durable = self.appended
+            self.pending += len(rows)
+            return self.appended
+
+    # Block until the record with the given ticket has been fsynced
+    def wait_durable(self, ticket):
+        with self.lock:
+            while self.durable < ticket:
+                self.durable_cond.wait()
+
+    # Write out the buffered records with one fsync, the caller holds io_lock
+    def commit_buffer(self):
+        with self.lock:
+            batch, self.buffer = self.buffer, []
+            ticket = self.appended
+        if batch:
+            self.writer.writerows(batch)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        with self.lock:
+            self.durable = max(self.durable, ticket)
+            self.durable_cond.notify_all()
+
+    # Committer thread for group-commit mode
+    def commit_thread_loop(self):
+        while True:
+            with self.lock:
+                while not self.buffer:
+                    self.appended_cond.wait()
+                # Let more records join the batch until the window closes or the batch is full
+                deadline = time.time() + self.window
+                while len(self.buffer) < self.batch_size:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self.appended_cond.wait(remaining)
+            with self.io_lock:
+                self.commit_buffer()
+
+    def replay(self, catalog):
+        # The rotated journal is only left behind if the last snapshot did not complete
+        for path in (self.rotated_file, self.journal_file):
+            if not os.path.isfile(path):
+                continue
+            with open(path, "r", newline="") as file:
+                for row in csv.reader(file):
+                    # Skip a torn last line from a crash in the middle of a write
+                    if len(row) != 3:
+                        continue
+                    toy, quantity, price = row
+                    try:
+                        catalog.put(toy, float(price), int(quantity))
+                    except ValueError:
+                        continue
+
+    def rotate(self):
+        with self.io_lock:
+            # Records appended before the rotation belong to the old journal
+            if self.group_commit:
+                self.commit_buffer()
+            self.file.close()
+            if os.path.isfile(self.rotated_file):
+                # A previous snapshot failed, keep its records in front of the new ones
+                with open(self.rotated_file, "a", newline="") as rotated, open(self.journal_file, "r", newline="") as current:
+                    rotated.write(current.read())
+                os.remove(self.journal_file)
+            else:
+                os.replace(self.journal_file, self.rotated_file)
+            self.file = open(self.journal_file, "a", newline="")
+            self.writer = csv.writer(self.file)
+            with self.lock:
+                self.pending = 0
+
+    def discard_rotated(self):
+        if os.path.isfile(self.rotated_file):
+            os.remove(self.rotated_file)
+
+
+class InvalidationDispatcher(object):
+    """Sends cache invalidations to the frontend from a background thread.
+    Changes of toys are queued with submit(), a toy that is already queued is only sent once with
+    its newest change. The sender thread posts up to batch_size queued toys per request over one
+    keep-alive session and retries failed batches with exponential backoff, so the frontend never
+    slows down orders.
+    """
+
+    def __init__(self, frontend_address, batch_size=64, backoff=0.1, max_backoff=5):
+        self.frontend_address = frontend_address
+        self.batch_size = batch_size
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.session = requests.Session()
+        # Queued toys in arrival order, the dict keys coalesce duplicates
+        self.queue = {}
+        self.cond = Condition()
+        self.sent = 0
+        self.retries = 0
+        self.sender_thread = Thread(target=self.sender_thread_loop)
+        self.sender_thread.daemon = True
+        self.sender_thread.start()
+
+    def submit(self, change):
+        with self.cond:
+            self.queue[change["name"]] = change
+            self.cond.notify()
+
+    def depth(self):
+        with self.cond:
+            return len(self.queue)
+
+    def stats(self):
+        with self.cond:
+            return {"queue_depth": len(self.queue), "sent": self.sent, "retries": self.retries}
+
+    def sender_thread_loop(self):
+        backoff = self.backoff
+        while True:
+            with self.cond:
+                while not self.queue:
+                    self.cond.wait()
+                toys = list(self.queue)[:self.batch_size]
+                batch = [self.queue.pop(toy) for toy in toys]
+
+            try:
+                response = self.session.post(f"{self.frontend_address}/invalidate", json={"items": batch}, timeout=5)
+                delivered = response.status_code == 200
+            except requests.exceptions.RequestException as e:
+                print(f"Invalidation request failed: {e}")
+                delivered = False
+
+            if delivered:
+                with self.cond:
+                    self.sent += len(batch)
+                backoff = self.backoff
+                continue
+
+            # Put the batch back unless the toy was queued again in the meantime, then wait before retrying
+            with self.cond:
+                self.retries += 1
+                for item in batch:
+                    self.queue.setdefault(item["name"], item)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+
+class ChangeFeed(object):
+    """Sequence-numbered feed of catalog changes that frontends follow with long polling.
+    The newest changes are kept in a ring buffer. A subscriber asks for the changes after the last
+    sequence number it has seen and waits up to a timeout while there are none. A subscriber that
+    fell behind the buffer, or that comes from another epoch because the catalog restarted, is told
+    to reset its cache.
+    """
+
+    def __init__(self, capacity=10000):
+        self.epoch = uuid.uuid4().hex
+        self.buffer = collections.deque(maxlen=capacity)
+        self.seq = 0
+        self.cond = Condition()
+        # (event loop, asyncio.Event) of the subscribers waiting in read_async
+        self.waiters = set()
+
+    def publish(self, change):
+        with self.cond:
+            self.seq += 1
+            self.buffer.append((self.seq, change))
+            self.cond.notify_all()
+            for loop, event in self.waiters:
+                loop.call_soon_threadsafe(event.set)
+
+    # Returns the sequence number to continue from, the changes after since and whether the subscriber has to reset
+    def read(self, since, epoch, timeout, limit=1000):
+        with self.cond:
+            # A new subscriber starts at the current position
+            if since is None:
+                return self.seq, [], False
+            if epoch != self.epoch or since > self.seq:
+                return self.seq, [], True
+
+            self.cond.wait_for(lambda: self.seq > since, timeout)
+            oldest = self.buffer[0][0] if self.buffer else self.seq + 1
+            if since + 1 < oldest:
+                return self.seq, [], True
+
+            start = since + 1 - oldest
+            changes = [dict(change, seq=seq) for seq, change in itertools.islice(self.buffer, start, start + limit)]
+            return (changes[-1]["seq"] if changes else since), changes, False
+
+    # read() for the asyncio server, the wait happens on the event loop instead of blocking a thread
+    async def read_async(self, since, epoch, timeout, limit=1000):
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self.cond:
+            # Only a subscriber that is up to date waits, read() answers the others at once
+            wait = since is not None and epoch == self.epoch and since == self.seq
+            if wait:
+                self.waiters.add(waiter)
+        if wait:
+            try:
+                await asyncio.wait_for(waiter[1].wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self.cond:
+                    self.waiters.discard(waiter)
+        return self.read(since, epoch, 0, limit)
+
+    def stats(self):
+        with self.cond:
+            return {"epoch": self.epoch, "sequence": self.seq, "buffered": len(self.buffer)}
+
+
+class DictCatalogStore(object):
+    """Catalog kept in a dictionary of {"Price": ..., "Quantity": ...} entries.
+    It is loaded from the CSV file and snapshots rewrite the CSV file.
+    """
+
+    def __init__(self, csv_file):
+        self.csv_file = csv_file
+        self.catalog = {}
+
+    def load(self):
+        with open(self.csv_file, "r") as file:
+            reader = csv.DictReader(file)
+            for row in reader:
+                self.catalog[row["Toy Name"]] = {"Price": float(row["Price"]), "Quantity": int(row["Quantity"])}
+
+    def __contains__(self, toy):
+        return toy in self.catalog
+
+    def __len__(self):
+        return len(self.catalog)
+
+    def names(self):
+        return list(self.catalog)
+
+    def price(self, toy):
+        return self.catalog[toy]["Price"]
+
+    def quantity(self, toy):
+        return self.catalog[toy]["Quantity"]
+
+    def set_quantity(self, toy, quantity):
+        self.catalog[toy]["Quantity"] = quantity
+
+    def put(self, toy, price, quantity):
+        self.catalog[toy] = {"Price": price, "Quantity": quantity}
+
+    # Copy the rows of the snapshot, the caller holds all locks
+    def begin_snapshot(self):
+        return [(toy, info["Quantity"], info["Price"]) for toy, info in self.catalog.items()]
+
+    # Write the snapshot next to the CSV file and swap it in, a crash leaves either the old or the new file
+    def write_snapshot(self, rows):
+        tmp_file = f"{self.csv_file}.tmp"
+        with open(tmp_file, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["Toy Name", "Quantity", "Price"])
+            writer.writerows(rows)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_file, self.csv_file)
+
+
+class MmapCatalogStore(object):
+    """Catalog kept in fixed-width arrays inside a memory-mapped file.
+    The file holds a header (magic, capacity, count, index size), the toy names as zero-padded
+    bytes, the prices (float64), the quantities (int64) and an open-addressing index from the
+    CRC32 of a name to its slot (int32, 0 marks a free entry): 48 bytes per slot plus the index.
+    The file is built from the CSV file once, later starts only map it. Snapshots flush the map.
+    """
+
+    MAGIC = b"TOYCAT01"
+    HEADER = struct.Struct("<8sqqq")
+    NAME_WIDTH = 32
+
+    def __init__(self, csv_file, mmap_file):
+        self.csv_file = csv_file
+        self.mmap_file = mmap_file
+
+    def load(self):
+        if not os.path.isfile(self.mmap_file):
+            self.build()
+        self.file = open(self.mmap_file, "r+b")
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        magic, self.capacity, self.count, self.index_size = self.HEADER.unpack_from(self.map, 0)
+        if magic != self.MAGIC:
+            raise RuntimeError(f'{self.mmap_file} is not a catalog file')
+
+        view = memoryview(self.map)
+        names_start = self.HEADER.size
+        prices_start = names_start + self.capacity * self.NAME_WIDTH
+        quantities_start = prices_start + self.capacity * 8
+        index_start = quantities_start + self.capacity * 8
+        self.names_view = view[names_start:prices_start]
+        self.prices = view[prices_start:quantities_start].cast("d")
+        self.quantities = view[quantities_start:index_start].cast("q")
+        self.index = view[index_start:index_start + self.index_size * 4].cast("i")
+
+    # Create the map file from the CSV file, with room for a quarter more toys
+    def build(self):
+        with open(self.csv_file, "r") as file:
+            count = sum(1 for _ in csv.DictReader(file))
+        capacity = count + count // 4 + 1024
+        index_size = 1
+        while index_size < 2 * capacity:
+            index_size *= 2
+
+        tmp_file = f"{self.mmap_file}.tmp"
+        with open(tmp_file, "w+b") as file:
+            file.truncate(self.HEADER.size + capacity * (self.NAME_WIDTH + 16) + index_size * 4)
+        self.mmap_file, target = tmp_file, self.mmap_file
+        with open(tmp_file, "r+b") as file:
+            self.map = mmap.mmap(file.fileno(), 0)
+            self.HEADER.pack_into(self.map, 0, self.MAGIC, capacity, 0, index_size)
+        self.map.close()
+
+        # Fill the new file through the normal insert path
+        self.load()
+        with open(self.csv_file, "r") as file:
+            for row in csv.DictReader(file):
+                self.put(row["Toy Name"], float(row["Price"]), int(row["Quantity"]))
+        self.write_snapshot(None)
+        self.close()
+        os.replace(tmp_file, target)
+        self.mmap_file = target
+
+    def close(self):
+        for view in (self.names_view, self.prices, self.quantities, self.index):
+            view.release()
+        self.map.close()
+        self.file.close()
+
+    # Return the slot of the toy, or -1 if it is not in the catalog
+    def slot(self, toy):
+        key = toy.encode().ljust(self.NAME_WIDTH, b"\0")
+        mask = self.index_size - 1
+        position = zlib.crc32(key) & mask
+        while True:
+            entry = self.index[position]
+            if entry == 0:
+                return -1
+            start = (entry - 1) * self.NAME_WIDTH
+            if self.names_view[start:start + self.NAME_WIDTH] == key:
+                return entry - 1
+            position = (position + 1) & mask
+
+    def __contains__(self, toy):
+        return len(toy.encode()) <= self.NAME_WIDTH and self.slot(toy) != -1
+
+    def __len__(self):
+        return self.count
+
+    def names(self):
+        width = self.NAME_WIDTH
+        for slot in range(self.count):
+            yield bytes(self.names_view[slot * width:(slot + 1) * width]).rstrip(b"\0").decode()
+
+    def price(self, toy):
+        return self.prices[self.slot(toy)]
+
+    def quantity(self, toy):
+        return self.quantities[self.slot(toy)]
+
+    def set_quantity(self, toy, quantity):
+        self.quantities[self.slot(toy)] = quantity
+
+    def put(self, toy, price, quantity):
+        key = toy.encode()
+        if len(key) > self.NAME_WIDTH:
+            raise ValueError(f'Toy name longer than {self.NAME_WIDTH} bytes: {toy}')
+        slot = self.slot(toy)
+        if slot == -1:
+            if self.count == self.capacity:
+                raise RuntimeError(f'{self.mmap_file} is full')
+            slot = self.count
+            start = slot * self.NAME_WIDTH
+            self.names_view[start:start + self.NAME_WIDTH] = key.ljust(self.NAME_WIDTH, b"\0")
+            # Linear probing from the hash of the name to the first free index entry
+            mask = self.index_size - 1
+            position = zlib.crc32(key.ljust(self.NAME_WIDTH, b"\0")) & mask
+            while self.index[position] != 0:
+                position = (position + 1) & mask
+            self.index[position] = slot + 1
+            self.count += 1
+            self.HEADER.pack_into(self.map, 0, self.MAGIC, self.capacity, self.count, self.index_size)
+        self.prices[slot] = price
+        self.quantities[slot] = quantity
+
+    # Nothing to copy, the map itself is the snapshot
+    def begin_snapshot(self):
+        return None
+
+    def write_snapshot(self, rows):
+        self.map.flush()
+
 
 #Catalog Server class for managing toy catalog and serving HTTP requests.
+#Index of the shard that owns the toy, toys are spread over the shards by the CRC32 of their name.
+def catalog_shard(toy, shards):
+    return zlib.crc32(toy.encode()) % shards
+
+#Current toys of a shard of an earlier split: its last snapshot (CSV or memory-mapped file) with its journals replayed.
+def shard_rows(shard_file):
+    mmap_file = f"{os.path.splitext(shard_file)[0]}.mmap"
+    store = MmapCatalogStore(shard_file, mmap_file) if os.path.isfile(mmap_file) else DictCatalogStore(shard_file)
+    store.load()
+    InventoryJournal(f"{shard_file}.journal").replay(store)
+    rows = [{"Toy Name": toy, "Quantity": store.quantity(toy), "Price": store.price(toy)} for toy in store.names()]
+    if isinstance(store, MmapCatalogStore):
+        store.close()
+    return rows
+
+#Split the catalog into one CSV file per shard and return their paths. The file names carry the shard count
+#(catalog.<i>of<N>.csv) and the files of a split are kept across runs, they hold its stock.
+#When the shard count changes, the new split is built from the most recent complete split of another count,
+#journals included, so no stock change is lost, and the files of that split are removed.
+#Without an earlier split the catalog CSV file is split.
+def shard_csv_files(csv_file, shards):
+    base, ext = os.path.splitext(csv_file)
+    shard_files = [f"{base}.{i}of{shards}{ext}" for i in range(shards)]
+    if all(os.path.isfile(shard_file) for shard_file in shard_files):
+        return shard_files
+
+    splits = {}
+    pattern = re.compile(rf"{re.escape(os.path.basename(base))}\.(\d+)of(\d+){re.escape(ext)}")
+    directory = os.path.dirname(csv_file) or "."
+    for name in os.listdir(directory):
+        match = pattern.fullmatch(name)
+        if match is not None:
+            splits.setdefault(int(match.group(2)), set()).add(int(match.group(1)))
+    old_files = []
+    changed = -1
+    for count, indexes in splits.items():
+        files = [f"{base}.{i}of{count}{ext}" for i in range(count)]
+        if count == shards or indexes != set(range(count)):
+            continue
+        # The split written to last holds the newest stock
+        split_changed = max(os.path.getmtime(path) for shard_file in files
+                            for path in (shard_file, f"{shard_file}.journal", f"{os.path.splitext(shard_file)[0]}.mmap")
+                            if os.path.isfile(path))
+        if split_changed > changed:
+            old_files, changed = files, split_changed
+
+    if old_files:
+        rows = [row for shard_file in old_files for row in shard_rows(shard_file)]
+    else:
+        with open(csv_file, "r") as file:
+            rows = list(csv.DictReader(file))
+    split_rows = [[] for _ in range(shards)]
+    for row in rows:
+        split_rows[catalog_shard(row["Toy Name"], shards)].append(row)
+
+    for shard_file, rows in zip(shard_files, split_rows):
+        temp_file = f"{shard_file}.tmp"
+        with open(temp_file, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=["Toy Name", "Quantity", "Price"], extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_file, shard_file)
+
+    # The old split is in the new one now, a later change back to its shard count must not reuse its stale files
+    for shard_file in old_files:
+        for path in (shard_file, f"{shard_file}.journal", f"{shard_file}.journal.old", f"{os.path.splitext(shard_file)[0]}.mmap"):
+            if os.path.isfile(path):
+                os.remove(path)
+    return shard_files
+
+#Run one catalog shard, the entry point of the shard processes.
+def run_shard(PORT, csv_file, cache, settings):
+    CatalogServer(PORT, csv_file, cache, **settings).start_server()
+
+#Encode a complete HTTP/1.1 response with its Content-Length.
+def encode_http(status, body=b"", content_type="application/json", headers=None):
+    head = f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\nContent-type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+    for name, value in (headers or {}).items():
+        head += f"{name}: {value}\r\n"
+    return (head + "\r\n").encode() + body
+
 class CatalogServer:
 
     #Initialize CatalogServer with the specified port and CSV file path.
-    def __init__(self, PORT, csv_file,cache : bool):
+    def __init__(self, PORT, csv_file,cache : bool, snapshot_interval=30, group_commit=False, group_commit_window=0.002, group_commit_batch_size=64, lock_stripes=64, restock_threshold=10, restock_amount=100, restock_policy_file=None, frontend_address=None, store="dict", mmap_file=None, server_mode="threaded", order_workers=32, reservation_ttl=30, reservation_sweep_interval=1, invalidation_mode="push", change_feed_size=10000, cache_update_mode="invalidate"):
         self.port = int(PORT)
+        # HTTP front end: "threaded" (one thread per connection) or "asyncio" (one event loop)
+        self.server_mode = server_mode
+        self.order_workers = order_workers
         self.csv_file = csv_file
-        # Initialize the catalog as an empty dictionary
-        self.catalog = {}  
-         # Initialize the read-write lock
-        self.rwlock = RWLock() 
+        # Initialize the catalog storage, a dictionary or fixed-width memory-mapped arrays
+        if store == "mmap":
+            self.catalog = MmapCatalogStore(csv_file, mmap_file or f"{os.path.splitext(csv_file)[0]}.mmap")
+        else:
+            self.catalog = DictCatalogStore(csv_file)
+        # Encoded lookup responses by toy name, dropped whenever the toy changes
+        self.responses = {}
+        # Version of every toy, sent as its ETag. Toys that did not change since the start have the start version,
+        # versions are taken from the clock at the start so they keep growing across restarts
+        self.start_version = time.time_ns()
+        self.versions = {}
+        self.version_counter = itertools.count(self.start_version + 1)
+        # Stock held by open reservations by toy name, the catalog storage and the journal keep the stock on hand,
+        # so holds are lost on a crash and their stock becomes available again
+        self.held = {}
+        # Open reservations by id: (expiry time, {toy name: quantity})
+        self.reservations = {}
+        self.reservations_lock = Lock()
+        self.reservation_ttl = reservation_ttl
+        self.reservation_sweep_interval = reservation_sweep_interval
+        self.reservation_thread = Thread(target=self.reservation_sweeper_loop)
+        self.reservation_thread.daemon = True
+        self.reservation_thread.start()
+        # Toy names in order for paging through the catalog, built on the first listing
+        self.sorted_names = None
+        self.sorted_names_lock = Lock()
+        # Per-toy striped locks, adding or removing toys requires all stripes
+        self.locks = StripedLock(lock_stripes)
         self.cache = cache
-        
-        self.restock_interval = 10  # Restock interval in seconds
+        # Changes are published to the change feed that frontends follow, in push mode they are also
+        # sent to the frontend as invalidations in the background
+        self.changes = ChangeFeed(change_feed_size)
+        # "invalidate" sends the name and version of a changed toy, "update" also sends its new price and quantity
+        self.cache_update_mode = cache_update_mode
+        self.invalidations = None
+        if self.cache == True and invalidation_mode == "push":
+            self.invalidations = InvalidationDispatcher(frontend_address)
+
+        # Every change is appended to the journal, the CSV file is only rewritten by the snapshot thread
+        self.journal = InventoryJournal(f"{csv_file}.journal", group_commit, group_commit_window, group_commit_batch_size)
+        self.snapshot_interval = snapshot_interval  # Snapshot interval in seconds
+        self.snapshot_thread = Thread(target=self.snapshot_thread_loop)
+        self.snapshot_thread.daemon = True
+        self.snapshot_thread.start()
+
+        # Default restocking policy, toys listed in the policy file get their own threshold and amount
+        self.restock_threshold = restock_threshold
+        self.restock_amount = restock_amount
+        self.restock_policy = {}
+        if restock_policy_file is not None and os.path.isfile(restock_policy_file):
+            with open(restock_policy_file, "r") as file:
+                for row in csv.DictReader(file):
+                    self.restock_policy[row["Toy Name"]] = (int(row["Threshold"]), int(row["Amount"]))
+
+        # Toys that fell to their threshold, lowest quantity first, waiting for the restock thread
+        self.low_stock = []
+        self.low_stock_names = set()
+        self.restock_cond = Condition()
         self.restock_thread = Thread(target=self.restock_toys_thread)
         self.restock_thread.daemon = True  # Daemonize the thread to automatically terminate when the main thread exits
         self.restock_thread.start()  # Start the restocking thread
 
     #Define a function to initialize a catalog with some initial data
     def init_catalog(self):
-        with self.rwlock.w_locked():
-            # Open the file in write mode and write the initial data to the catalog in memory
-            with open(self.csv_file, "r") as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    product_name = row["Toy"]
-                    price = float(row["Price"])
-                    quantity = int(row["Quantity"])
-                    self.catalog[product_name] = {"Price": price, "Quantity": quantity}
-    
+        with self.locks.all_locked():
+            # Load the last snapshot into the catalog storage
+            self.catalog.load()
+
+            # Apply the changes made after the last snapshot
+            self.journal.replay(self.catalog)
+            self.journal.open()
+
     #Lookup a toy in the catalog by name.
     def lookup(self, toy_name):
-        # Read from hashmap and return the data if the toyname is valid
-        with self.rwlock.r_locked():
+        # Read the price and quantity together if the toyname is valid
+        with self.locks.locked(toy_name):
             if toy_name in self.catalog:
-                return True
+                return self.catalog.price(toy_name), self.available(toy_name)
             return -1
 
+    #Return the version of the toy.
+    def version(self, toy):
+        return self.versions.get(toy, self.start_version)
+
+    #Give the toy a new version and drop its encoded lookup response, the caller holds the lock of the toy.
+    def changed(self, toy):
+        self.versions[toy] = next(self.version_counter)
+        self.responses.pop(toy, None)
+
+    #Return the complete HTTP response for a lookup of the toy, or None if the toy is not in the catalog.
+    #Responses are encoded once and reused until the price or quantity of the toy changes.
+    #If if_none_match holds the current ETag of the toy, the response is 304 Not Modified without a body.
+    def lookup_response(self, toy_name, if_none_match=None):
+        with self.locks.locked(toy_name):
+            if toy_name not in self.catalog:
+                return None
+            etag = f'"{self.version(toy_name)}"'
+            if if_none_match is not None and etag in [tag.strip() for tag in if_none_match.split(",")]:
+                return f"HTTP/1.1 304 Not Modified\r\nETag: {etag}\r\nContent-Length: 0\r\n\r\n".encode()
+            response = self.responses.get(toy_name)
+            if response is None:
+                response = self.encode_response(toy_name)
+                self.responses[toy_name] = response
+            return response
+
+    #Parameters of a /changes request: since, epoch, timeout and limit. Raises ValueError if a number is not a number.
+    def changes_query(self, path):
+        query_params = parse_qs(urlparse(path).query)
+        since = int(query_params["since"][0]) if "since" in query_params else None
+        epoch = query_params.get("epoch", [None])[0]
+        timeout = float(query_params.get("timeout", [30])[0])
+        limit = int(query_params.get("limit", [1000])[0])
+        # Also false for a timeout that is not a number (nan)
+        if not (timeout >= 0 and limit >= 1):
+            raise ValueError(f"Invalid timeout or limit: {timeout}, {limit}")
+        return since, epoch, min(timeout, 60), min(limit, 10000)
+
+    #Encode the HTTP response for the changes read from the change feed.
+    def changes_response(self, next_seq, changes, reset):
+        response = {"data": {"epoch": self.changes.epoch, "next": next_seq, "reset": reset, "changes": changes}}
+        return encode_http(200, json.dumps(response).encode())
+
+    #Encode the HTTP response for a lookup of the toy, the caller holds the lock of the toy.
+    def encode_response(self, toy_name):
+        version = self.version(toy_name)
+        body = json.dumps({"data": {"name": toy_name, "price": self.catalog.price(toy_name), "quantity": self.available(toy_name), "version": version}}).encode()
+        return encode_http(200, body, headers={"ETag": f'"{version}"'})
+
+    #Lookup several toys at once, returns the found toys and the names that are not in the catalog.
+    def lookup_many(self, toy_names):
+        with self.locks.many_locked(toy_names):
+            found = [{"name": toy_name, "price": self.catalog.price(toy_name), "quantity": self.available(toy_name), "version": self.version(toy_name)}
+                     for toy_name in toy_names if toy_name in self.catalog]
+            not_found = [toy_name for toy_name in toy_names if toy_name not in self.catalog]
+        return found, not_found
+
+    #List up to limit toys ordered by name, starting after the given name.
+    #Returns the toys and the name to continue from, which is None on the last page.
+    def list_products(self, after, limit):
+        with self.sorted_names_lock:
+            if self.sorted_names is None:
+                self.sorted_names = sorted(self.catalog.names())
+            sorted_names = self.sorted_names
+        start = bisect.bisect_right(sorted_names, after) if after else 0
+        page = sorted_names[start:start + limit]
+        found, _ = self.lookup_many(page)
+        next_after = page[-1] if start + limit < len(sorted_names) else None
+        return found, next_after
+
+    #Add a toy to the catalog, or set the price and quantity of a toy it already has.
+    #Returns 1 if the toy is new and 0 if it was already in the catalog.
+    def add_product(self, toy_name, price, quantity):
+        # A new name changes the layout of the store, so all stripes are taken
+        with self.locks.all_locked():
+            added = 0 if toy_name in self.catalog else 1
+            self.catalog.put(toy_name, price, quantity)
+            ticket = self.update(toy_name)
+            self.check_stock(toy_name)
+        if added:
+            with self.sorted_names_lock:
+                self.sorted_names = None
+
+        self.journal.wait_durable(ticket)
+        return added
+
     # Define a function to perform Order, returning the value indicating the result of the trade
     def order(self, toy_name, quantity):
-        with self.rwlock.w_locked():
+        # Only the stripe of this toy is locked, so orders for other toys go ahead in parallel
+        with self.locks.locked(toy_name):
             # Check if order will occur
-            if toy_name in self.catalog and self.catalog[toy_name]["Quantity"] >= quantity:
-                self.catalog[toy_name]["Quantity"] -= quantity
-                # Update the catalog CSV file after ordering
-                self.update()  
-                return 1
+            if toy_name not in self.catalog or self.available(toy_name) < quantity:
+                return -1
+            self.catalog.set_quantity(toy_name, self.catalog.quantity(toy_name) - quantity)
+            # Record the new quantity in the journal after ordering
+            ticket = self.update(toy_name)
+            self.check_stock(toy_name)
+
+        # Acknowledge the order only once it is durable, outside the lock so other orders can join the batch
+        self.journal.wait_durable(ticket)
+        return 1
+
+    # Order several toys at once, either every line of the cart is ordered or none is.
+    # Returns the ordered lines with their prices, or -1 if any toy is unknown or out of stock.
+    def order_many(self, items):
+        # Add up the lines asking for the same toy
+        wanted = {}
+        for toy_name, quantity in items:
+            if quantity <= 0:
+                return -1
+            wanted[toy_name] = wanted.get(toy_name, 0) + quantity
+
+        # Take the locks of all toys in the cart once
+        with self.locks.many_locked(wanted):
+            for toy_name, quantity in wanted.items():
+                if toy_name not in self.catalog or self.available(toy_name) < quantity:
+                    return -1
+            rows = []
+            for toy_name, quantity in wanted.items():
+                self.catalog.set_quantity(toy_name, self.catalog.quantity(toy_name) - quantity)
+                self.changed(toy_name)
+                rows.append([toy_name, self.catalog.quantity(toy_name), self.catalog.price(toy_name)])
+                self.check_stock(toy_name)
+            # Record the whole cart with one journal write
+            ticket = self.journal.append_many(rows)
+            ordered = [{"name": toy_name, "price": self.catalog.price(toy_name), "quantity": quantity} for toy_name, quantity in items]
+
+        self.journal.wait_durable(ticket)
+        return ordered
+
+    #Quantity of the toy that can still be ordered or reserved, the caller holds the lock of the toy.
+    def available(self, toy):
+        return self.catalog.quantity(toy) - self.held.get(toy, 0)
+
+    # Hold the toys of a cart until the hold is committed, released or expires after ttl seconds.
+    # Returns the reservation id, or -1 if any toy is unknown or out of stock.
+    def reserve(self, items, ttl=None):
+        # Add up the lines asking for the same toy
+        wanted = {}
+        for toy_name, quantity in items:
+            if quantity <= 0:
+                return -1
+            wanted[toy_name] = wanted.get(toy_name, 0) + quantity
+
+        with self.locks.many_locked(wanted):
+            for toy_name, quantity in wanted.items():
+                if toy_name not in self.catalog or self.available(toy_name) < quantity:
+                    return -1
+            for toy_name, quantity in wanted.items():
+                self.held[toy_name] = self.held.get(toy_name, 0) + quantity
+                self.changed(toy_name)
+                self.check_stock(toy_name)
+
+            reservation_id = uuid.uuid4().hex
+            with self.reservations_lock:
+                self.reservations[reservation_id] = (time.time() + (ttl or self.reservation_ttl), wanted)
+        return reservation_id
+
+    # Take an open reservation out of the table, returns its toys or None if it is unknown or has expired.
+    def take_reservation(self, reservation_id):
+        with self.reservations_lock:
+            reservation = self.reservations.pop(reservation_id, None)
+        if reservation is None:
+            return None
+        expiry, wanted = reservation
+        if expiry <= time.time():
+            self.release_holds(wanted)
+            return None
+        return wanted
+
+    # Turn the held stock of a reservation into an order.
+    # Returns the ordered toys with their prices, or -1 if the reservation is unknown or has expired.
+    def commit(self, reservation_id):
+        wanted = self.take_reservation(reservation_id)
+        if wanted is None:
+            return -1
+
+        with self.locks.many_locked(wanted):
+            rows = []
+            for toy_name, quantity in wanted.items():
+                self.drop_hold(toy_name, quantity)
+                self.catalog.set_quantity(toy_name, self.catalog.quantity(toy_name) - quantity)
+                self.changed(toy_name)
+                rows.append([toy_name, self.catalog.quantity(toy_name), self.catalog.price(toy_name)])
+            # Record the whole reservation with one journal write
+            ticket = self.journal.append_many(rows)
+            ordered = [{"name": toy_name, "price": self.catalog.price(toy_name), "quantity": quantity} for toy_name, quantity in wanted.items()]
+
+        self.journal.wait_durable(ticket)
+        return ordered
+
+    # Give the held stock of a reservation back, returns 1 or -1 if the reservation is unknown or has expired.
+    def release(self, reservation_id):
+        wanted = self.take_reservation(reservation_id)
+        if wanted is None:
             return -1
+        self.release_holds(wanted)
+        return 1
+
+    # Make held stock available again.
+    def release_holds(self, wanted):
+        with self.locks.many_locked(wanted):
+            for toy_name, quantity in wanted.items():
+                self.drop_hold(toy_name, quantity)
+                self.changed(toy_name)
 
-    #Update the CSV file with the current catalog data.
-    def update(self):
-        # Reads the data
-        df = pd.read_csv(self.csv_file)
-        for toy, info in self.catalog.items():
-            if toy in df['Toy'].values:
-                df.loc[df['Toy'] == toy, 'Quantity'] = info['Quantity']
-                df.loc[df['Toy'] == toy, 'Price'] = info['Price']
-        df.to_csv(self.csv_file, index=False)
-
-    # Method for periodic restocking of toys.
+        if self.cache == True:
+            for toy_name in wanted:
+                self.invalidation_request(toy_name)
+
+    # Lower the held quantity of a toy, the caller holds the lock of the toy.
+    def drop_hold(self, toy_name, quantity):
+        held = self.held.get(toy_name, 0) - quantity
+        if held > 0:
+            self.held[toy_name] = held
+        else:
+            self.held.pop(toy_name, None)
+
+    # Method for releasing the reservations that were neither committed nor released in time.
+    def reservation_sweeper_loop(self):
+        while True:
+            time.sleep(self.reservation_sweep_interval)
+            now = time.time()
+            with self.reservations_lock:
+                expired = [reservation_id for reservation_id, (expiry, _) in self.reservations.items() if expiry <= now]
+                expired_holds = [self.reservations.pop(reservation_id)[1] for reservation_id in expired]
+            for wanted in expired_holds:
+                self.release_holds(wanted)
+
+    #Append the current state of a toy to the journal and return its ticket, the caller holds the lock of the toy.
+    #Also gives the toy a new version.
+    def update(self, toy):
+        self.changed(toy)
+        return self.journal.append(toy, self.catalog.quantity(toy), self.catalog.price(toy))
+
+    #Write a snapshot of the whole catalog and start a new journal.
+    def snapshot(self):
+        # Copy the catalog and rotate the journal together, so the journal holds exactly the changes after the copy
+        with self.locks.all_locked():
+            rows = self.catalog.begin_snapshot()
+            self.journal.rotate()
+
+        self.catalog.write_snapshot(rows)
+        self.journal.discard_rotated()
+
+    # Method for periodic snapshots of the catalog.
+    def snapshot_thread_loop(self):
+        while True:
+            time.sleep(self.snapshot_interval)
+            # A failed snapshot leaves the rotated journal behind, the next interval tries again
+            if self.journal.opened.is_set() and (self.journal.pending > 0 or os.path.isfile(self.journal.rotated_file)):
+                try:
+                    self.snapshot()
+                except (OSError, RuntimeError) as e:
+                    print(f"Snapshot failed: {e}")
+
+    #Return the restock threshold and amount of a toy.
+    def restock_rule(self, toy):
+        return self.restock_policy.get(toy, (self.restock_threshold, self.restock_amount))
+
+    #Queue the toy for restocking once it has fallen to its threshold, the caller holds the lock of the toy.
+    def check_stock(self, toy):
+        quantity = self.available(toy)
+        threshold, _ = self.restock_rule(toy)
+        if quantity <= threshold:
+            with self.restock_cond:
+                if toy not in self.low_stock_names:
+                    self.low_stock_names.add(toy)
+                    heapq.heappush(self.low_stock, (quantity, toy))
+                    self.restock_cond.notify()
+
+    # Method for restocking the toys that were queued by check_stock.
     def restock_toys_thread(self):
+        # Queue the toys that are already low on stock once the catalog is loaded
+        self.journal.opened.wait()
+        for toy in self.catalog.names():
+            with self.locks.locked(toy):
+                self.check_stock(toy)
+
         while True:
-            time.sleep(self.restock_interval)
-            with self.rwlock.w_locked():
-                for toy, info in self.catalog.items():
-                        # Restock quantity
-                        if self.catalog[toy]["Quantity"] <= 10:
-                            self.catalog[toy]["Quantity"] += 100  
-                            print("cache val: ", cache)
-                            print("self.cache: ",type(self.cache))
-                            if self.cache == True:
-                                # Send an invalidation request to the frontend
-                                self.invalidation_request(toy)
-                       
-                            # Update the catalog CSV file
-                            self.update()  
+            # Sleep until some toy falls to its threshold, then take all queued toys
+            with self.restock_cond:
+                while not self.low_stock:
+                    self.restock_cond.wait()
+                queued = []
+                while self.low_stock:
+                    _, toy = heapq.heappop(self.low_stock)
+                    self.low_stock_names.discard(toy)
+                    queued.append(toy)
+
+            restocked = []
+            for toy in queued:
+                threshold, amount = self.restock_rule(toy)
+                # Restock quantity, only holding the lock of this toy
+                with self.locks.locked(toy):
+                    if self.available(toy) <= threshold:
+                        self.catalog.set_quantity(toy, self.catalog.quantity(toy) + amount)
+                        # Record the restocked quantity in the journal
+                        self.update(toy)
+                        restocked.append(toy)
 
+            if self.cache == True:
+                # Send the invalidation requests to the frontend without holding any lock
+                for toy in restocked:
+                    self.invalidation_request(toy)
+
+    #Publish the change of the toy to the change feed and, in push mode, queue an invalidation for the frontend cache.
+    #In update mode the change carries the new price and quantity, so the frontend can overwrite its cached copy.
     def invalidation_request(self, toy):
-        request_url = f'http://{frontend_host}:{frontend_port}'
-        url = f'{request_url}/invalidate?toy={toy}'
-        frontend_response = requests.post(url)
-        if frontend_response.status_code != 200:
-            raise RuntimeError('Problematic response to the invalidation request')  
-                    
-    # Define a class to handle HTTP requests for the stock catalog
+        with self.locks.locked(toy):
+            change = {"name": toy, "version": self.version(toy)}
+            if self.cache_update_mode == "update":
+                change["price"] = self.catalog.price(toy)
+                change["quantity"] = self.available(toy)
+        self.changes.publish(change)
+        if self.invalidations is not None:
+            self.invalidations.submit(change)
+
+    #Handle one request of the frontend or the order service and return the complete HTTP response.
+    #Shared by the threaded and the asyncio front ends.
+    def handle_request(self, method, path, body, if_none_match=None):
+        if method == "GET":
+
+            # Bulk lookup (/products?names=a,b,c) or a page of the catalog (/products?after=<name>&limit=<n>)
+            if path.startswith("/products"):
+
+                query_params = parse_qs(urlparse(path).query)
+                if "names" in query_params:
+                    toy_names = [toy_name for toy_name in query_params["names"][0].split(",") if toy_name]
+                    found, not_found = self.lookup_many(toy_names)
+                    response = {"data": found, "not_found": not_found}
+                else:
+                    after = query_params.get("after", [""])[0]
+                    try:
+                        limit = min(int(query_params.get("limit", [100])[0]), 1000)
+                    except ValueError:
+                        limit = 0
+                    if limit < 1:
+                        return encode_http(400, content_type="text/plain")
+                    found, next_after = self.list_products(after, limit)
+                    response = {"data": found, "next": next_after}
+
+                return encode_http(200, json.dumps(response).encode())
+
+            # Statistics of the background work of the catalog
+            elif path.startswith("/stats"):
+                stats = {"invalidations": self.invalidations.stats() if self.invalidations is not None else None,
+                         "changes": self.changes.stats()}
+                return encode_http(200, json.dumps({"data": stats}).encode())
+
+            # Changes after a sequence number (/changes?since=<seq>&epoch=<epoch>&timeout=<seconds>), waits while there are none
+            elif path.startswith("/changes"):
+                try:
+                    since, epoch, timeout, limit = self.changes_query(path)
+                except ValueError:
+                    return encode_http(400, content_type="text/plain")
+                return self.changes_response(*self.changes.read(since, epoch, timeout, limit))
+
+            # If the request is for toy lookup
+            elif path.startswith("/product"):
+
+                # Parse the toy name from the request URL
+                toy_name = path.split("/")[-1]
+                # Look up the ready-made response of the toy in the catalog, or 304 if the client has its current version
+                response = self.lookup_response(toy_name, if_none_match)
+
+                # If the toy is found, the response already holds its data as JSON
+                if response is not None:
+                    return response
+
+                # If the toy is not found, return an error response
+                return encode_http(404, content_type="text/plain")
+
+        # Add a toy (PUT /product/<name> with {"price": ..., "quantity": ...}) or replace its price and quantity
+        elif method == "PUT" and path.startswith("/product/"):
+            toy_name = path.split("/")[-1]
+            try:
+                request_body = json.loads(body)
+                price, quantity = float(request_body["price"]), int(request_body["quantity"])
+                if not toy_name or price < 0 or quantity < 0:
+                    raise ValueError(f"Invalid toy: {toy_name}")
+                added = self.add_product(toy_name, price, quantity)
+            except (ValueError, KeyError, TypeError):
+                return encode_http(400, json.dumps({"error": {"code": 400, "message": "A toy needs a name, a price and a quantity of at least 0"}}).encode())
+            # A memory-mapped catalog file has no room left for a new toy
+            except RuntimeError as e:
+                return encode_http(507, json.dumps({"error": {"code": 507, "message": str(e)}}).encode())
+
+            # The frontend may remember the toy as unknown or hold an older price
+            if self.cache == True:
+                self.invalidation_request(toy_name)
+
+            response = {"data": {"name": toy_name, "price": price, "quantity": quantity, "version": self.version(toy_name)}}
+            return encode_http(201 if added else 200, json.dumps(response).encode())
+
+        elif method == "POST":
+
+            # Order a whole cart at once
+            if path == "/orders/batch":
+                request_body = json.loads(body)
+                items = [(item["name"], int(float(item["quantity"]))) for item in request_body["items"]]
+
+                # Order all the toys of the cart, nothing is ordered if one of them fails
+                result = self.order_many(items)
+
+                if result != -1:
+                    response = encode_http(200, json.dumps({"data": result}).encode())
+                    ordered_toys = {toy_n for toy_n, _ in items}
+                else:
+                    response = encode_http(400, content_type="text/plain")
+                    ordered_toys = set()
+
+            # Hold the toys of a cart for the order service
+            elif path == "/reserve":
+                request_body = json.loads(body)
+                items = [(item["name"], int(float(item["quantity"]))) for item in request_body["items"]]
+                ttl = request_body.get("ttl")
+
+                reservation_id = self.reserve(items, float(ttl) if ttl else None)
+
+                if reservation_id != -1:
+                    response = encode_http(200, json.dumps({"data": {"reservation_id": reservation_id}}).encode())
+                    ordered_toys = {toy_n for toy_n, _ in items}
+                else:
+                    response = encode_http(400, content_type="text/plain")
+                    ordered_toys = set()
+
+            # Order the toys held by a reservation
+            elif path.startswith("/commit/"):
+                result = self.commit(path.split("/")[-1])
+
+                # The stock on hand and the held stock drop together, the available quantity is unchanged
+                ordered_toys = set()
+                if result != -1:
+                    response = encode_http(200, json.dumps({"data": result}).encode())
+                else:
+                    response = encode_http(404, content_type="text/plain")
+
+            # Give the toys held by a reservation back, the frontend is notified by release_holds
+            elif path.startswith("/release/"):
+                result = self.release(path.split("/")[-1])
+
+                ordered_toys = set()
+                if result != -1:
+                    response = encode_http(200, content_type="text/plain")
+                else:
+                    response = encode_http(404, content_type="text/plain")
+
+            # Check the validity of URL
+            elif path.startswith("/orders"):
+                result = path.split("/")
+
+                # Parse the request to get the toy name, quantity
+                toy_n = result[2]
+                quantity_of_toy = result[3]
+
+                # Order the specified toy according to the request
+                result = self.order(toy_n, int(float(quantity_of_toy)))
+
+                # Send the appropriate response based on the result of the order operation
+                if result == 1:
+                    response = {"data": {"name": toy_n, "price":self.catalog.price(toy_n) , "quantity": quantity_of_toy}}
+                    response = encode_http(200, json.dumps(response).encode(), content_type="text/plain")
+                else:
+                    response = encode_http(400, content_type="text/plain")
+                ordered_toys = {toy_n}
+
+            else:
+                raise RuntimeError(f'Invalid URL: {path}')
+
+            if self.cache == True:
+                # Send an invalidation request to the frontend
+                for toy_n in ordered_toys:
+                    self.invalidation_request(toy_n)
+
+            return response
+
+        raise RuntimeError(f'Invalid URL: {path}')
+
+    #Start the HTTP front end chosen by the server mode.
     def start_server(self):
+        if self.server_mode == "asyncio":
+            self.start_asyncio_server()
+        else:
+            self.start_threaded_server()
+
+    # Define a class to handle HTTP requests for the stock catalog
+    def start_threaded_server(self):
         class CatalogRequestHandler(http.server.BaseHTTPRequestHandler):
 
+            # Keep connections alive, every response carries a Content-Length
+            protocol_version = "HTTP/1.1"
+
             # Handle GET requests from both the frontend
             def do_GET(self):
+                self.wfile.write(self.server.catalog_server.handle_request("GET", self.path, None, self.headers.get("If-None-Match")))
 
-                # If the request is for toy lookup
-                if self.path.startswith("/product"):
-
-                    # Parse the toy name from the request URL
-                    toy_name = self.path.split("/")[-1]
-                    # Look up the toy in the catalog
-                    result = self.server.catalog_server.lookup(toy_name)
-                    
-                    # If the toy is found, return its data as a JSON response
-                    if result == 1:
-                        self.send_response(200)
-                        self.send_header("Content-type", "application/json")
-                        self.end_headers()
-                        response = {"data": {"name": toy_name, "price": self.server.catalog_server.catalog[toy_name]["Price"], "quantity": self.server.catalog_server.catalog[toy_name]["Quantity"]}}
-                        self.wfile.write(json.dumps(response).encode())
-                        
-                    # If the toy is not found, return an error response
-                    else:
-                        self.send_response(404)
-                        self.send_header("Content-type", "text/plain")
-                        self.end_headers()
-                        
-                # If the request is not for toy lookup, delegate to the base class
-                else:
-                    raise RuntimeError(f'Invalid URL: {self.path}') 
-                    
             # Handle POST requests from the order service
             def do_POST(self):
+                content_length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(content_length)
+                self.wfile.write(self.server.catalog_server.handle_request("POST", self.path, body))
 
-                # Check the validity of URL
-                if self.path.startswith("/orders"):
-                    result = self.path.split("/")
-
-                    # Parse the request to get the toy name, quantity
-                    toy_n = result[2]
-                    quantity_of_toy = result[3]
-
-                    # Order the specified toy according to the request
-                    result = self.server.catalog_server.order(toy_n, int(float(quantity_of_toy)))
-
-                    # Send the appropriate response based on the result of the order operation
-                    if result == 1:
-                        self.send_response(200)
-                        self.send_header("Content-type", "text/plain")
-                        self.end_headers()
-                        response = {"data": {"name": toy_n, "price":self.server.catalog_server.catalog[toy_n]["Price"] , "quantity": quantity_of_toy}}
-                        self.wfile.write(json.dumps(response).encode())
-                    else:
-                        self.send_response(400)
-                        self.send_header("Content-type", "text/plain")
-                        self.end_headers()
-                        
-                else:
-                    raise RuntimeError(f'Invalid URL: {self.path}') 
-                    
-
-                if cache == True:
-                    # Send an invalidation request to the frontend
-                    server.invalidation_request(toy_n)
+            # Handle PUT requests that add toys
+            def do_PUT(self):
+                content_length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(content_length)
+                self.wfile.write(self.server.catalog_server.handle_request("PUT", self.path, body))
 
         # Define a subclass of HTTPServer that uses threading to handle multiple requests concurrently
         class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
+            # The frontends open many pooled connections at once, listen with the asyncio server's backlog instead of the default of 5
+            request_queue_size = 1024
+            # Kept-alive connections of the frontends must not keep the process from exiting
+            daemon_threads = True
+
             # Override the init function to save metadata in the server
             def __init__(self, host_port_tuple, streamhandler):
                 super().__init__(host_port_tuple, streamhandler)
-                self.protocol_version = "HTTP/1.1"
            
 
         # Create a threaded HTTP server that listens on the specified port and handles requests with the CatalogRequestHandler class
         httpd = ThreadedHTTPServer(("", self.port), CatalogRequestHandler)
         httpd.catalog_server = self
-        max_threads = multiprocessing.cpu_count()
-        executor = ThreadPoolExecutor(max_workers=max_threads)
-        httpd.executor = executor
         
         # Initiate the toys and prices in the catalog
         self.init_catalog()  
@@ -255,16 +1246,130 @@ class CatalogServer:
         print(f"Serving on port {self.port}")
         httpd.serve_forever()
 
+    #Serve the requests of one keep-alive connection on the event loop.
+    async def serve_connection(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                # Read the request line and the headers
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, version = request_line.decode("iso-8859-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("iso-8859-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                # Single toy lookups only touch memory and are answered on the event loop,
+                # everything else may write the journal or walk the whole catalog and runs in the executor
+                if method == "GET" and path.startswith("/product/"):
+                    response = self.handle_request(method, path, body, headers.get("if-none-match"))
+                # Long polls for changes wait on the event loop, they must not hold the workers that serve the orders
+                elif method == "GET" and path.startswith("/changes"):
+                    try:
+                        since, epoch, timeout, limit = self.changes_query(path)
+                        response = self.changes_response(*(await self.changes.read_async(since, epoch, timeout, limit)))
+                    except ValueError:
+                        response = encode_http(400, content_type="text/plain")
+                else:
+                    response = await loop.run_in_executor(self.executor, self.handle_request, method, path, body)
+
+                writer.write(response)
+                await writer.drain()
+
+                connection = headers.get("connection", "").lower()
+                if connection == "close" or (version == "HTTP/1.0" and connection != "keep-alive"):
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, RuntimeError, ValueError) as e:
+            print(f"Closing connection: {e}")
+        finally:
+            writer.close()
+
+    # Serve all connections from one asyncio event loop
+    def start_asyncio_server(self):
+        # Orders wait for the disk in these threads, not on the event loop
+        self.executor = ThreadPoolExecutor(max_workers=self.order_workers)
+
+        async def serve():
+            server = await asyncio.start_server(self.serve_connection, "", self.port, reuse_address=True, backlog=1024)
+            async with server:
+                await server.serve_forever()
+
+        # Initiate the toys and prices in the catalog
+        self.init_catalog()
+
+        # Start serving requests on the specified port
+        print(f"Serving on port {self.port} (asyncio)")
+        asyncio.run(serve())
+
 if __name__ == "__main__":
     PORT = os.getenv("catalog_PORT")
     frontend_host = os.getenv("host")
     frontend_port = os.getenv("frontend_port")
+    frontend_address = f"http://{frontend_host}:{frontend_port}"
 
     csv_file = os.getenv("catalog_csv_file")
+    snapshot_interval = float(os.getenv("catalog_snapshot_interval", 30))
+    # Group commit settings, the window is given in milliseconds
+    group_commit = os.getenv("catalog_group_commit", "false").lower() == 'true'
+    group_commit_window = float(os.getenv("catalog_group_commit_window_ms", 2)) / 1000
+    group_commit_batch_size = int(os.getenv("catalog_group_commit_batch_size", 64))
+    lock_stripes = int(os.getenv("catalog_lock_stripes", 64))
+    restock_threshold = int(os.getenv("catalog_restock_threshold", 10))
+    restock_amount = int(os.getenv("catalog_restock_amount", 100))
+    restock_policy_file = os.getenv("catalog_restock_policy_file")
+    # Catalog storage: "dict" (default) or "mmap" for fixed-width memory-mapped arrays
+    store = os.getenv("catalog_store", "dict")
+    mmap_file = os.getenv("catalog_mmap_file")
+    # HTTP front end: "threaded" (default) or "asyncio"
+    server_mode = os.getenv("catalog_server_mode", "threaded")
+    order_workers = int(os.getenv("catalog_order_workers", 32))
+    # Seconds a reservation of the order service holds its stock before it is released
+    reservation_ttl = float(os.getenv("catalog_reservation_ttl", 30))
+    # How frontends learn about changes: "push" (invalidations are posted to the frontend) or "feed" (frontends follow /changes)
+    invalidation_mode = os.getenv("cache_invalidation_mode", "push")
+    change_feed_size = int(os.getenv("catalog_change_feed_size", 10000))
+    # "invalidate" (default) or "update" to send the new price and quantity with every change
+    cache_update_mode = os.getenv("cache_update_mode", "invalidate")
     cache_include = os.getenv("cache_include")
     # Convert the string value to a boolean
     cache = cache_include.lower() == 'true' 
     print("CACHE: ",cache)
 
-    server = CatalogServer(PORT, csv_file,cache)
-    server.start_server()
\ No newline at end of file
+    settings = dict(snapshot_interval=snapshot_interval,
+                    group_commit=group_commit,
+                    group_commit_window=group_commit_window,
+                    group_commit_batch_size=group_commit_batch_size,
+                    lock_stripes=lock_stripes,
+                    restock_threshold=restock_threshold,
+                    restock_amount=restock_amount,
+                    restock_policy_file=restock_policy_file,
+                    frontend_address=frontend_address,
+                    store=store,
+                    mmap_file=mmap_file,
+                    server_mode=server_mode,
+                    order_workers=order_workers,
+                    reservation_ttl=reservation_ttl,
+                    invalidation_mode=invalidation_mode,
+                    change_feed_size=change_feed_size,
+                    cache_update_mode=cache_update_mode)
+
+    # Number of catalog processes, shard i owns its own CSV file and journal and listens on catalog_PORT + i
+    shards = int(os.getenv("catalog_shards", 1))
+    if shards == 1:
+        server = CatalogServer(PORT, csv_file, cache, **settings)
+        server.start_server()
+    else:
+        settings["mmap_file"] = None
+        processes = []
+        for shard, shard_file in enumerate(shard_csv_files(csv_file, shards)):
+            process = multiprocessing.Process(target=run_shard, args=(int(PORT) + shard, shard_file, cache, settings))
+            process.start()
+            processes.append(process)
+        for process in processes:
+            process.join()
@@ -79,6 +79,10 @@ class ToyStoreClient:
 
                 print(response.json())  
 
+                # Remember the order to verify it at the end of the session
+                if response.status_code == 200:
+                    placed_orders[response.json()["data"]["order_number"]] = (product_name, quant)
+
         return  total_query_time,total_buy_time   
 
 if __name__ == "__main__":
@@ -93,6 +97,8 @@ if __name__ == "__main__":
     # Initialize variables to track total query time and total buy time
     total_query_time = 0
     total_buy_time = 0 
+    # Orders placed in the session by order number, with their toy name and quantity
+    placed_orders = {}
 
     # Define lists of toy names and order quantities ,"Book","Bear","Tux","Shark"
     TOY_NAME_LIST = ["Tux", "Dolphin", "Whale", "Python", "Elephant","Fox"]
@@ -106,3 +112,13 @@ if __name__ == "__main__":
     
     print("total_query_time: ",total_query_time)
     print("total_buy_time: ",total_buy_time)
+
+    # Verify that every order placed in the session is returned with the same toy and quantity
+    mismatches = 0
+    for order_number, (product_name, quant) in placed_orders.items():
+        response = session.get(f'http://{host}:{port}/orders/{order_number}')
+        data = response.json().get('data') if response.status_code == 200 else None
+        if data is None or data.get('Toy name') != product_name or float(data.get('Quantity')) != float(quant):
+            mismatches += 1
+            print("Order mismatch: ", order_number, response.json())
+    print(f"Verified {len(placed_orders) - mismatches} of {len(placed_orders)} orders")
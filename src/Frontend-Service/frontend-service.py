@@ -4,202 +4,429 @@ import json
 from dotenv import load_dotenv
 import os
 import requests
-from urllib.parse import parse_qs
-from contextlib import contextmanager
-from threading  import Lock
+from urllib.parse import parse_qs,urlparse
+from threading  import Lock,Thread,Condition,Event
+from concurrent.futures import ThreadPoolExecutor, Future
 from collections import OrderedDict
+import zlib
+import math
+import itertools
+import urllib3
+import time
+import sys
+import signal
 
 # Load environment variables from .env file
 load_dotenv()
 
-class RWLock(object):
-    """ RWLock class based on https://gist.github.com/tylerneylon/a7ff6017b7a1f9a506cf75aa23eacfd6
-        Usage:
-            my_obj_rwlock = RWLock()
+class Node:
+    def __init__(self, key,val,version=None,expires=None):
+        self.key,self.val = key, val
+        # Catalog version of the value, a stale node is kept so it can be revalidated with its version
+        self.version = version
+        self.stale = False
+        # Time the value stops being fresh, None keeps it fresh until it is evicted or invalidated
+        self.expires = expires
+        self.refreshing = False
+        # Number of times the value was served, kept in cache snapshots to warm up the hottest toys first
+        self.count = 0
 
-            # When reading from my_obj:
-            with my_obj_rwlock.r_locked():
-                do_read_only_things_with(my_obj)
+class CountMinSketch(object):
+    """Approximate access counts of keys, in depth rows of counters that stop at 15. A key is counted
+    in one counter per row and its count is the smallest of them. All counters are halved after
+    sample_size increments, so toys that were popular a while ago fade out."""
 
-            # When writing to my_obj:
-            with my_obj_rwlock.w_locked():
-                mutate(my_obj)
-    """
-    def __init__(self):
-        self.w_lock = Lock()
-        self.num_r_lock = Lock()
-        self.num_r = 0
-
-    # ___________________________________________________________________
-    # Reading methods.
-    def r_acquire(self):
-        self.num_r_lock.acquire()
-        self.num_r += 1
-        if self.num_r == 1:
-            self.w_lock.acquire()
-        self.num_r_lock.release()
-
-    def r_release(self):
-        assert self.num_r > 0
-        self.num_r_lock.acquire()
-        self.num_r -= 1
-        if self.num_r == 0:
-            self.w_lock.release()
-        self.num_r_lock.release()
-
-    @contextmanager
-    def r_locked(self):
-        try:
-            self.r_acquire()
-            yield
-        finally:
-            self.r_release()
+    def __init__(self, width, depth=4, sample_size=None):
+        self.width = 1 << max(4, (int(width) - 1).bit_length())
+        self.mask = self.width - 1
+        self.rows = [bytearray(self.width) for _ in range(depth)]
+        self.sample_size = sample_size or 10 * int(width)
+        self.additions = 0
 
-    # ___________________________________________________________________
-    # Writing methods.
+    def indexes(self, key):
+        return [hash((row, key)) & self.mask for row in range(len(self.rows))]
 
-    def w_acquire(self):
-        self.w_lock.acquire()
+    def increment(self, key):
+        for row, index in zip(self.rows, self.indexes(key)):
+            if row[index] < 15:
+                row[index] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            for row in self.rows:
+                row[:] = bytes(count >> 1 for count in row)
+            self.additions //= 2
 
-    def w_release(self):
-        self.w_lock.release()
+    def estimate(self, key):
+        return min(row[index] for row, index in zip(self.rows, self.indexes(key)))
 
-    @contextmanager
-    def w_locked(self):
-        try:
-            self.w_acquire()
-            yield
-        finally:
-            self.w_release()
+class LRUAdmission(object):
+    """Admits every new item, the least recently used item is evicted for it."""
 
+    def record(self, key):
+        pass
 
-class Node:
-    def __init__(self, key,val):
-        self.key,self.val = key, val
-        self.prev = self.next = None
+    def admit(self, candidate, victim):
+        return True
+
+class TinyLFUAdmission(object):
+    """Admits a new item only if it was accessed more often than the item it would evict, so a scan
+    over rare toys cannot flush the popular ones. Accesses are counted in a CountMinSketch."""
+
+    def __init__(self, capacity):
+        self.sketch = CountMinSketch(8 * max(1, capacity))
+
+    def record(self, key):
+        self.sketch.increment(key)
+
+    def admit(self, candidate, victim):
+        return self.sketch.estimate(candidate) > self.sketch.estimate(victim)
+
+class CacheSegment(object):
+    """One segment of the LRU cache with its own lock. The OrderedDict keeps the nodes from least
+    to most recently used, so lookups, moves and evictions are O(1). The admission policy decides
+    whether a new item may evict the least recently used one."""
+
+    def __init__(self, capacity, policy="lru"):
+        self.capacity = capacity
+        self.nodes = OrderedDict()
+        self.lock = Lock()
+        if policy == "tinylfu":
+            self.policy = TinyLFUAdmission(capacity)
+        else:
+            self.policy = LRUAdmission()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejections = 0
+        self.invalidations = 0
 
 class LRUCache(object):
+    """Thread-safe LRU cache split into segments by the hash of the key, each segment is an
+    independent LRU with its own lock and a share of the capacity, so handler threads working on
+    different toys do not wait for each other. Counts hits, misses, evictions and invalidations.
 
-    def __init__(self,capacity):
+    Items are fresh for ttl seconds. For stale_ttl seconds after that they are still served while
+    refresh(key) fetches them again in the background, later they expire and are a miss. With a ttl
+    of 0, items stay fresh until they are evicted or invalidated.
+    """
+
+    def __init__(self,capacity,segments=16,ttl=0,stale_ttl=0,refresh=None,policy="lru"):
         """
         :type capacity: int
         """
-        self.cap = capacity
-        self.cache = OrderedDict()
-        self.left,self.right = Node(0,0),Node(0,0)
-        self.left.next,self.right.prev = self.right,self.left
-        self.rwlock = RWLock()
-
-    def remove(self, node):
-        nxt,prev = node.next,node.prev
-        prev.next,nxt.prev = nxt,prev 
-    
-    def insert(self,node):
-        prev,nxt = self.right.prev,self.right
-        prev.next = nxt.prev = node
-        
-        node.prev = prev
-        node.next = nxt
-       
+        self.cap = int(capacity)
+        # Admission policy of the segments: "lru" admits every item, "tinylfu" only items used more often than the one they evict
+        self.policy = policy
+        self.ttl = float(ttl)
+        self.stale_ttl = float(stale_ttl)
+        self.refresh = refresh
+        # Every segment holds at least one item, the capacities add up to the capacity of the cache
+        count = max(1, min(int(segments), self.cap))
+        self.segments = [CacheSegment(self.cap // count + (1 if i < self.cap % count else 0), policy) for i in range(count)]
+
+    def segment(self, key):
+        return self.segments[hash(key) % len(self.segments)]
+
+    def expiry(self):
+        return time.time() + self.ttl if self.ttl > 0 else None
+
     def get(self, key):
         """
         Return:
-            returns -1 if the key is not found
+            returns -1 if the key is not found, invalidated or expired
         """
-        if key in self.cache:
-            # Remove the item before putting it into the cache so the item can be the newest in the cache
-    
-            self.remove(self.cache[key])
-            self.insert(self.cache[key])
-            return self.cache[key].val
-        return -1
-    
-    def put(self, key, value):
-        print("Capacity: ",len(self.cache))
-        with self.rwlock.w_locked():
-            if key in self.cache:
-                # Pop the item before putting it into the cache
-                self.remove(self.cache[key])
-            
-            self.cache[key] = Node(key,value)
-            self.insert(self.cache[key])
-        
-            if len(self.cache) > int(self.cap):
-                print("exceeds cap")
-                print("Before remove: ",len(self.cache))
-                lru = self.left.next
-                self.remove(lru)
-                del self.cache[lru.key]
-                print("After remove: ",len(self.cache))
-            
+        segment = self.segment(key)
+        refresh = False
+        with segment.lock:
+            segment.policy.record(key)
+            node = segment.nodes.get(key)
+            if node is None or node.stale:
+                segment.misses += 1
+                return -1
+
+            now = time.time()
+            if node.expires is not None and node.expires <= now:
+                # Past the stale window the item is expired, it is revalidated like an invalidated item
+                if self.refresh is None or node.expires + self.stale_ttl <= now:
+                    segment.misses += 1
+                    return -1
+                # Within the stale window the item is served and refreshed once in the background
+                if not node.refreshing:
+                    node.refreshing = True
+                    refresh = True
+                segment.stale_hits += 1
+            else:
+                segment.hits += 1
+            node.count += 1
+
+            # Move the item to the end so it is the newest in the segment
+            segment.nodes.move_to_end(key)
+            value = node.val
+
+        if refresh:
+            self.refresh(key)
+        return value
     
+    def put(self, key, value, version=None):
+        segment = self.segment(key)
+        with segment.lock:
+            node = segment.nodes.get(key)
+            if node is not None:
+                # Keep the cached value if it is newer, a late response must not replace it
+                if version is not None and node.version is not None and node.version > version:
+                    return
+                segment.nodes.move_to_end(key)
+            elif len(segment.nodes) >= segment.capacity:
+                # A new item has to evict the least recently used one, if the policy admits it
+                victim = next(iter(segment.nodes))
+                if not segment.policy.admit(key, victim):
+                    segment.rejections += 1
+                    return
+                del segment.nodes[victim]
+                segment.evictions += 1
+            segment.nodes[key] = Node(key,value,version,self.expiry())
+            if node is not None:
+                segment.nodes[key].count = node.count
+
+    def version_of(self, key):
+        """
+        Return:
+            returns the version of the cached item, fresh or stale, None if the key is not found
+        """
+        segment = self.segment(key)
+        with segment.lock:
+            node = segment.nodes.get(key)
+            return None if node is None else node.version
+
+    def revalidate(self, key, version):
+        """
+        Mark a stale item as fresh again after the catalog confirmed its version.
+        Return:
+            returns the value, -1 if the key is not found or has another version
+        """
+        segment = self.segment(key)
+        with segment.lock:
+            node = segment.nodes.get(key)
+            if node is None or node.version != version:
+                return -1
+            node.stale = False
+            node.expires = self.expiry()
+            node.refreshing = False
+            segment.nodes.move_to_end(key)
+            return node.val
+
+    def invalidate(self, key, version=None):
+        """
+        Mark the item stale if it is older than the version, without a version the item is removed.
+        Return:
+            returns 1 if the item was invalidated, 0 if the invalidation is older than the item, -1 if the key is not found
+        """
+        if version is None:
+            return self.pop(key)
+        segment = self.segment(key)
+        with segment.lock:
+            node = segment.nodes.get(key)
+            if node is None:
+                return -1
+            # Invalidations can arrive out of order, an older one must not invalidate a newer item
+            if node.version is not None and node.version >= version:
+                return 0
+            node.stale = True
+            segment.invalidations += 1
+            return 1
+
+    def update(self, key, value, version):
+        """
+        Overwrite a cached item in place with a newer version, items that are not cached are not added.
+        Return:
+            returns 1 if the item was updated, 0 if the update is older than the item, -1 if the key is not found
+        """
+        segment = self.segment(key)
+        with segment.lock:
+            node = segment.nodes.get(key)
+            if node is None:
+                return -1
+            if node.version is not None and node.version >= version:
+                return 0
+            node.val, node.version, node.stale = value, version, False
+            node.expires = self.expiry()
+            return 1
+
+    def refresh_done(self, key):
+        """
+        Allow the next stale read of the item to refresh it again, called when a background refresh ends.
+        """
+        segment = self.segment(key)
+        with segment.lock:
+            node = segment.nodes.get(key)
+            if node is not None:
+                node.refreshing = False
+
+    def invalidate_all(self):
+        """
+        Mark every item stale, used when the changes since the items were cached are unknown.
+        """
+        for segment in self.segments:
+            with segment.lock:
+                for node in segment.nodes.values():
+                    node.stale = True
+                segment.invalidations += len(segment.nodes)
+
     def pop(self, key):
         """
         Return:
             returns 1 if operation succeeds, -1 if the key is not found
         """
-        with self.rwlock.w_locked():
-            if key not in self.cache:
+        segment = self.segment(key)
+        with segment.lock:
+            if segment.nodes.pop(key, None) is None:
                 return -1
-            else:
-                self.remove(self.cache[key])
-                del self.cache[key]
-                return 1
-
-def leader_selection(server):
-    print("LEADER SELECTION")
-    # Try to connect to an order server, starting from the highest id
-    server.leader_id = None
-    while server.leader_id is None:
-    # Try each order service until a leader is found
-        for order_id in server.sorted_order_ids: 
-            #Create the order address
-            order_port = os.getenv(f"ORDER_PORT_{order_id}")
-            order_host = os.getenv(f"ORDER_HOST_{order_id}")
-            order_address = f"http://{order_host}:{order_port}"
-            # Ping the order service
-            print(f'{order_address}/ping')
-            try:
-                # Ping the server and see if there is a receipt
-                response = requests.get(f"{order_address}/ping",params={'message': 'Ping'})
-                print(response.json())
+            segment.invalidations += 1
+            return 1
 
-                # If response '200', pick it as the leader
-                if response.status_code == 200:
-                    server.leader_id = order_id
-                    data = {'leader_id': server.leader_id, 'message': 'You win'}
-                    response = requests.post(f"{order_address}/leaderselection",data=data)
-                    print("Response from leader:",response.json())
+    def entries(self):
+        """
+        Return:
+            returns the cached items with their versions and access counts, used for cache snapshots
+        """
+        entries = []
+        for segment in self.segments:
+            with segment.lock:
+                entries.extend({"key": node.key, "value": node.val, "version": node.version, "count": node.count}
+                               for node in segment.nodes.values())
+        return entries
+
+    def restore(self, entries):
+        """
+        Load the items of a cache snapshot, from the least to the most used. They are loaded stale
+        and only served once the catalog has confirmed their versions.
+        """
+        for entry in entries:
+            key = entry["key"]
+            segment = self.segment(key)
+            with segment.lock:
+                node = Node(key,entry["value"],entry["version"],self.expiry())
+                node.stale = True
+                node.count = entry["count"]
+                segment.nodes[key] = node
+                segment.nodes.move_to_end(key)
+                if len(segment.nodes) > segment.capacity:
+                    segment.nodes.popitem(last=False)
+                    segment.evictions += 1
 
+    def stats(self):
+        stats = {"capacity": self.cap, "segments": len(self.segments), "policy": self.policy, "size": 0, "hits": 0, "stale_hits": 0,
+                 "misses": 0, "evictions": 0, "rejections": 0, "invalidations": 0}
+        for segment in self.segments:
+            with segment.lock:
+                stats["size"] += len(segment.nodes)
+                stats["hits"] += segment.hits
+                stats["stale_hits"] += segment.stale_hits
+                stats["misses"] += segment.misses
+                stats["evictions"] += segment.evictions
+                stats["rejections"] += segment.rejections
+                stats["invalidations"] += segment.invalidations
+        lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["hits"] + stats["stale_hits"]) / lookups if lookups > 0 else 0
+        return stats
 
-                    break
-            except:
-                    continue
-            
-    if server.leader_id:   # Notify all replicas that a leader has been selected     
-        for replica_id in server.sorted_order_ids:
+class NegativeCache(object):
+    """Thread-safe cache of toy names the catalog does not have. Names expire after ttl seconds and
+    the oldest name is dropped beyond capacity, so unknown names cannot grow it without bound.
+    """
+
+    def __init__(self,capacity,ttl):
+        self.cap = int(capacity)
+        self.ttl = float(ttl)
+        # Expiry time by name, from oldest to newest
+        self.names = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __contains__(self, key):
+        with self.lock:
+            expires = self.names.get(key)
+            if expires is None:
+                return False
+            if expires <= time.time():
+                del self.names[key]
+                return False
+            self.hits += 1
+            return True
+
+    def add(self, key):
+        with self.lock:
+            self.names.pop(key, None)
+            self.names[key] = time.time() + self.ttl
+            if len(self.names) > self.cap:
+                self.names.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self.lock:
+            if self.names.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def invalidate_all(self):
+        with self.lock:
+            self.invalidations += len(self.names)
+            self.names.clear()
 
-                    if replica_id!=order_id:
-                        replica_port = os.getenv(f"ORDER_PORT_{replica_id}")
-                        replica_host = os.getenv(f"ORDER_HOST_{replica_id}")
-                        replica_address = f"http://{replica_host}:{replica_port}"
-                        # If no response, just continue      
-                        try:
-                            response = requests.post(f"{replica_address}/inform_replica", data={'leader_id': server.leader_id})
-                            print("Response from replicas",response.json()) 
-                        except:
-                            continue  # Try the next replica
+    def stats(self):
+        with self.lock:
+            return {"capacity": self.cap, "ttl": self.ttl, "size": len(self.names), "hits": self.hits,
+                    "evictions": self.evictions, "invalidations": self.invalidations}
 
+# True if a failed request provably never reached the server: the connection could not be opened at all
+def request_not_sent(e):
+    if isinstance(e, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(e.args[0], "reason", None) if e.args else None
+    return isinstance(e, requests.exceptions.ConnectionError) and isinstance(reason, urllib3.exceptions.NewConnectionError)
+
+# An order line needs a toy name and a finite quantity, the order service checks that the quantity is positive
+def valid_order_item(item):
+    if not isinstance(item, dict) or not isinstance(item.get("name"), str) or not item["name"]:
+        return False
+    try:
+        return math.isfinite(float(item.get("quantity")))
+    except (TypeError, ValueError):
+        return False
 
 # Define a toy request handler class that handles HTTP GET and POST requests
 class FrontEndRequestHandler(BaseHTTPRequestHandler):
 
+    # Keep connections alive, every response carries a Content-Length
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, send them without waiting for the client's delayed ACK
+    disable_nagle_algorithm = True
+
     # Handle a GET request.
     def do_GET(self):
-        self.protocol_version = "HTTP/1.1" 
+
+        # Bulk lookup (/products?names=a,b,c) or a page of the catalog (/products?after=<name>&limit=<n>)
+        if self.path.startswith("/products"):
+
+            query_params = parse_qs(urlparse(self.path).query)
+            if "names" in query_params:
+                product_names = [product_name for product_name in query_params["names"][0].split(",") if product_name]
+                response = self.server.front_end_service.query_products(product_names)
+            else:
+                after = query_params.get("after", [""])[0]
+                try:
+                    limit = min(max(int(query_params.get("limit", ["100"])[0]), 1), 1000)
+                except ValueError:
+                    limit = None
+                if limit is None:
+                    response = {"error": {"code": 400, "message": "The limit must be a number"}}
+                else:
+                    response = self.server.front_end_service.list_products(after, limit)
 
         # Check the validity of URL
-        if self.path.startswith("/product"):
+        elif self.path.startswith("/product"):
 
             # Extract the toy name from the URL query parameter
             product_name = self.path.split("/")[-1]  
@@ -217,20 +444,35 @@ class FrontEndRequestHandler(BaseHTTPRequestHandler):
             else:
                 response = cache_item 
 
+        # Statistics of the cache
+        elif self.path.startswith("/cache/stats"):
+            if self.server.cache_or_not == True:
+                response = {"data": self.server.lrucache.stats()}
+                response["data"]["coalesced"] = self.server.coalesced
+                if self.server.negative_cache is not None:
+                    response["data"]["negative"] = self.server.negative_cache.stats()
+                if self.server.order_cache is not None:
+                    response["data"]["orders"] = self.server.order_cache.stats()
+            else:
+                response = {"error": {"code": 404, "message": "The cache is disabled"}}
+
         # Query existing orders
         elif self.path.startswith("/orders"):
 
             # Extract the order number from the URL
-            order_number = self.path.split("/")[-1]  
-                    
+            try:
+                order_number = int(self.path.split("/")[-1])
+            except ValueError:
+                order_number = None
+
+            if order_number is None:
+                response = {"error": {"code": 400, "message": "The order number must be a number"}}
             # Forward the request to the order server
-            response = self.server.front_end_service.query_order_number(self.server,order_number)
+            else:
+                response = self.server.front_end_service.query_order_number(self.server,str(order_number))
             
         # The URL of the GET request is invalid -> raise error 404 
         else:
-            self.send_response(404)
-            self.send_header("Content-type", "text/plain")
-            self.end_headers()
             response = {"error": {"code": 404, "message": f"invalid URL: {self.path}"}}
             
         self.send_custom_response(response)  
@@ -238,34 +480,47 @@ class FrontEndRequestHandler(BaseHTTPRequestHandler):
     # override the default do_POST() method
     def do_POST(self):
 
-        self.protocol_version = "HTTP/1.1"
-
         # Handle a POST request.
         if self.path.startswith("/orders"):
             
             content_length = int(self.headers["Content-Length"])
             post_data = self.rfile.read(content_length)
-            request_body = json.loads(post_data)
+            try:
+                request_body = json.loads(post_data)
+            except ValueError:
+                request_body = None
 
-            # Forward the request to the order server
-            response = self.server.front_end_service.place_order(self.server,request_body)  
+            # Reject a malformed order here, the order service would drop the connection and look like a failed leader
+            if not isinstance(request_body, dict) or not (valid_order_item(request_body) or "items" in request_body):
+                response = {"error": {"code": 400, "message": "An order needs a toy name and a quantity"}}
+            # Forward the request to the order server, a body with "items" is a cart with several toys
+            elif "items" in request_body:
+                items = request_body["items"]
+                if isinstance(items, list) and len(items) > 0 and all(valid_order_item(item) for item in items):
+                    response = self.server.front_end_service.place_cart(self.server,request_body)
+                else:
+                    response = {"error": {"code": 400, "message": "Every toy of the cart needs a name and a quantity"}}
+            else:
+                response = self.server.front_end_service.place_order(self.server,request_body)  
+
+        # Invalidation request from Catalog, a single toy (?toy=<name>) or a batch of changes
+        # ({"items": [{"name": <name>, "version": <version>}, ...]}, with "price" and "quantity" in update mode)
+        elif self.path.startswith("/invalidate"):
+
+            query_params = parse_qs(urlparse(self.path).query)
+            if "toy" in query_params:
+                items = [{"name": query_params["toy"][0]}]
+            else:
+                content_length = int(self.headers["Content-Length"])
+                items = json.loads(self.rfile.read(content_length))["items"]
 
-        # Invalidation request from Catalog
-        elif self.path.startswith("/invalidate?toy="):
-            
             if self.server.cache_or_not == True:
-                toy_name = self.path.split('=')[-1]
-                self.server.lrucache.pop(toy_name)
-                self.send_response(200)
-                self.send_header("Content-type", "text/plain")
-                self.end_headers()
-                response = "The item was successfully removed from the cache"
+                for item in items:
+                    self.server.front_end_service.apply_change(item)
+            response = {"data": {"invalidated": len(items)}}
 
         else:
             # The URL of the POST request does not start wtih "/orders" -> raise error 404 
-            self.send_response(404)
-            self.send_header("Content-type", "text/plain")
-            self.end_headers()
             response = {
                 "error": {
                     "code": 404, 
@@ -282,57 +537,382 @@ class FrontEndRequestHandler(BaseHTTPRequestHandler):
             ) 
         else:
             self.send_response(200)  
+        body = json.dumps(response).encode("utf-8")
         self.send_header("Content-type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
         self.end_headers()
-        self.wfile.write(
-            json.dumps(response).encode("utf-8")
-        )  
+        self.wfile.write(body)
 
 
 class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
-    pass
+    # Kept-alive connections (clients, the catalog's invalidations) must not keep the process from exiting
+    daemon_threads = True
 
 # Define a threaded HTTP server that allows for multiple concurrent requests.
 class FrontEndService(ThreadedHTTPServer):
      # Override the init function to save metadata in the server
-    def __init__(self, port, catalog_address, order_ids,cache_s,c):
+    def __init__(self, port, catalog_address, order_ids,cache_s,c, catalog_addresses=None, invalidation_mode="push",
+                 order_addresses=None, pool_size=32, connect_timeout=1, read_timeout=10, cache_segments=16,
+                 cache_ttl=0, cache_stale_ttl=0, negative_cache_size=1000, negative_cache_ttl=5,
+                 cache_snapshot_file=None, cache_snapshot_interval=60, cache_policy="lru",
+                 health_check_interval=0.5, health_check_timeout=0.2, health_check_failures=2, leader_wait=2,
+                 follower_reads=True, order_cache_size=10000):
 
         super().__init__(("", port), FrontEndRequestHandler)
         self.front_end_service = self  
         self.catalog_address = catalog_address  
+        # Addresses of the catalog shards, shard i owns the toys whose name hashes to i
+        self.catalog_addresses = catalog_addresses or [catalog_address]
         self.order_ids = order_ids
 
-        self.sorted_order_ids = sorted(self.order_ids, reverse=True)
-        #order_host = os.getenv("ORDER_HOST")   #Needs to be changed 
+        # Addresses of the order replicas by id, computed once instead of on every request
+        self.order_addresses = order_addresses or {
+            order_id: f"http://{os.getenv(f'ORDER_HOST_{order_id}')}:{os.getenv(f'ORDER_PORT_{order_id}')}" for order_id in self.order_ids
+        }
+
+        # Keep-alive connections to the catalog and the order services, shared by all handler threads.
+        # Each backend gets at most pool_size connections, a request waits for a free one.
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=len(self.catalog_addresses) + len(self.order_addresses),
+                                                pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("http://", adapter)
+        self.connect_timeout = connect_timeout
+        self.timeout = (connect_timeout, read_timeout)
 
+        # The leader is kept up to date by the health monitor, requests only read it.
+        # Requests that find no leader wait for one on leader_cond for at most leader_wait seconds.
         self.leader_id = None
-       
-        # Read-write lock
-        self.rwlock = RWLock()
+        self.leader_cond = Condition()
+        self.leader_wait = leader_wait
+        # Order replicas that are up, a replica is down after health_check_failures health checks in a row
+        # went unanswered or as soon as a request to it fails
+        self.alive = set()
+        self.probe_failures = {order_id: 0 for order_id in self.order_ids}
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+        self.health_check_failures = health_check_failures
+        self.health_wakeup = Event()
+        self.health_stop = Event()
+        # One thread per replica for the probes and as many for telling the replicas about a new leader
+        self.health_executor = ThreadPoolExecutor(max_workers=2 * len(self.order_ids))
+
+        # Order lookups are spread over all replicas that are up, in turn
+        self.follower_reads = follower_reads
+        self.read_counter = itertools.count()
+
+        # Orders never change, so looked up and placed orders are cached without invalidation
+        self.order_cache = LRUCache(order_cache_size, cache_segments) if order_cache_size > 0 else None
+
+        # Catalog lookups in flight by toy name, concurrent misses on a toy wait for the same lookup
+        self.inflight = {}
+        self.inflight_lock = Lock()
+        self.coalesced = 0
+
 
         # Initialize cache
         self.cache_or_not = c
         print("Cache request: ",self.cache_or_not)
         if self.cache_or_not == True:
-            self.lrucache = LRUCache(cache_s)
+            # Items served during their stale window are fetched again by these threads
+            self.refresh_executor = ThreadPoolExecutor(max_workers=4)
+            self.lrucache = LRUCache(cache_s, cache_segments, cache_ttl, cache_stale_ttl, self.refresh_product, cache_policy)
+        # Periodic snapshots of the cached items and their access counts, reloaded by warm_up() after a restart
+        self.cache_snapshot_file = cache_snapshot_file if self.cache_or_not == True else None
+        self.cache_snapshot_interval = cache_snapshot_interval
+        if self.cache_snapshot_file:
+            snapshot_thread = Thread(target=self.cache_snapshot_loop)
+            snapshot_thread.daemon = True
+            snapshot_thread.start()
+
+        # Toys the catalog does not have, lookups for them are answered without asking the catalog again
+        self.negative_cache = NegativeCache(negative_cache_size, negative_cache_ttl) if self.cache_or_not == True and negative_cache_size > 0 else None
+
+        # In feed mode the cache follows the change feed of every catalog shard instead of waiting for /invalidate
+        if self.cache_or_not == True and invalidation_mode == "feed":
+            for address in self.catalog_addresses:
+                subscriber = Thread(target=self.follow_changes, args=(address,))
+                subscriber.daemon = True
+                subscriber.start()
+
+    # Start the background health checks of the order replicas
+    def start_health_monitor(self):
+        monitor = Thread(target=self.health_monitor_loop)
+        monitor.daemon = True
+        monitor.start()
+
+    def health_monitor_loop(self):
+        while not self.health_stop.is_set():
+            self.check_health()
+            # A request that saw the leader fail wakes the monitor up early, without a leader it checks again soon
+            self.health_wakeup.wait(self.health_check_interval if self.leader_id is not None else self.health_check_timeout)
+            self.health_wakeup.clear()
+
+    # Stop the health monitor together with the server
+    def server_close(self):
+        self.health_stop.set()
+        self.health_wakeup.set()
+        super().server_close()
+
+    # Ping one order replica with a short timeout
+    def probe(self, order_id):
+        try:
+            response = self.session.get(f"{self.order_addresses[order_id]}/ping", params={'message': 'Ping'},
+                                        timeout=(self.health_check_timeout, self.health_check_timeout))
+            return response.status_code == 200
+        except requests.exceptions.RequestException:
+            return False
+
+    # Ping all order replicas at once. If the leader is down, the replica with the highest id that is up becomes the leader.
+    def check_health(self):
+        probes = {order_id: self.health_executor.submit(self.probe, order_id) for order_id in self.order_ids}
+        answered = {order_id: probe.result() for order_id, probe in probes.items()}
+        with self.leader_cond:
+            for order_id, up in answered.items():
+                self.probe_failures[order_id] = 0 if up else self.probe_failures[order_id] + 1
+                if up:
+                    self.alive.add(order_id)
+                elif self.probe_failures[order_id] >= self.health_check_failures:
+                    self.alive.discard(order_id)
+            if self.leader_id in self.alive:
+                return
+            self.set_leader(max(self.alive) if self.alive else None)
+
+    # A request to the leader failed, switch to the next responsive replica at once and let the monitor check again
+    def leader_failed(self, order_id):
+        with self.leader_cond:
+            self.alive.discard(order_id)
+            if self.leader_id == order_id:
+                self.set_leader(max(self.alive) if self.alive else None)
+        self.health_wakeup.set()
+
+    # Point requests to a new leader and tell the replicas about it in the background, the caller holds leader_cond
+    def set_leader(self, leader_id):
+        if leader_id == self.leader_id:
+            return
+        print(f"Leader changed from {self.leader_id} to {leader_id}")
+        self.leader_id = leader_id
+        self.leader_cond.notify_all()
+        if leader_id is not None:
+            self.health_executor.submit(self.announce_leader, leader_id)
+
+    def announce_leader(self, leader_id):
+        try:
+            data = {'leader_id': leader_id, 'message': 'You win'}
+            self.session.post(f"{self.order_addresses[leader_id]}/leaderselection", data=data, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            print(f"Leader {leader_id} not told about its selection: {e}")
+        for replica_id in self.order_ids:
+            if replica_id != leader_id:
+                try:
+                    self.session.post(f"{self.order_addresses[replica_id]}/inform_replica", data={'leader_id': leader_id}, timeout=self.timeout)
+                except requests.exceptions.RequestException:
+                    continue
+
+    # Return the current leader, waiting at most leader_wait seconds if there is none, or None if no replica is responsive
+    def current_leader(self):
+        with self.leader_cond:
+            self.leader_cond.wait_for(lambda: self.leader_id is not None, self.leader_wait)
+            return self.leader_id
+
+    # Send a request to the leader. If the leader fails, the request is sent to the next leader, once per replica.
+    # A POST is only sent again if it never left the frontend, i.e. no connection to the leader could be opened.
+    # Any other failure, such as a read timeout or a dropped connection, is raised because the leader may already
+    # have placed the order. Errors that are not about the leader (an invalid URL or body) are raised as well.
+    # Returns None if no order replica answered.
+    def leader_request(self, method, path, **kwargs):
+        for _ in range(len(self.order_ids)):
+            leader_id = self.current_leader()
+            if leader_id is None:
+                return None
+            try:
+                return self.session.request(method, f"{self.order_addresses[leader_id]}{path}", timeout=self.timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                # Passive health check
+                print(f'An request exception occurs: {e}. Switching from leader {leader_id}.')
+                self.leader_failed(leader_id)
+                if method != "GET" and not request_not_sent(e):
+                    raise
+        return None
+
+    # Write the cached items and their access counts to the snapshot file, the most used first.
+    # The snapshot is written next to the file and swapped in, so a crash leaves the old or the new one.
+    def save_cache_snapshot(self):
+        entries = sorted(self.lrucache.entries(), key=lambda entry: entry["count"], reverse=True)
+        tmp_file = f"{self.cache_snapshot_file}.tmp"
+        with open(tmp_file, "w") as file:
+            json.dump({"entries": entries}, file)
+        os.replace(tmp_file, self.cache_snapshot_file)
+
+    def cache_snapshot_loop(self):
+        while True:
+            time.sleep(self.cache_snapshot_interval)
+            try:
+                self.save_cache_snapshot()
+            except OSError as e:
+                print(f"Cache snapshot failed: {e}")
+
+    # Fill the cache before serving requests, with the toys of the last cache snapshot (most used first)
+    # or, without a snapshot, with the catalog in name order up to the cache size
+    def warm_up(self):
+        if self.cache_or_not != True:
+            return 0
+
+        entries = []
+        if self.cache_snapshot_file and os.path.isfile(self.cache_snapshot_file):
+            try:
+                with open(self.cache_snapshot_file, "r") as file:
+                    entries = json.load(file)["entries"][:self.lrucache.cap]
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Cache snapshot {self.cache_snapshot_file} not loaded: {e}")
+                entries = []
+            # The items are stale until the catalog confirms them below, or later with a conditional GET
+            self.lrucache.restore(reversed(entries))
+
+        loaded = 0
+        try:
+            if entries:
+                names = [entry["key"] for entry in entries]
+                for start in range(0, len(names), 100):
+                    products = self.query_products(names[start:start + 100])
+                    # The catalog is not reachable, the restored items stay stale
+                    if "error" in products:
+                        raise RuntimeError(products["error"]["message"])
+                    loaded += len(products["data"])
+            else:
+                after = ""
+                while after is not None and loaded < self.lrucache.cap:
+                    page = self.list_products(after, min(1000, self.lrucache.cap - loaded))
+                    if "error" in page:
+                        raise RuntimeError(page["error"]["message"])
+                    for product in page["data"]:
+                        self.lrucache.put(product["name"], {"data": product}, product.get("version"))
+                    loaded += len(page["data"])
+                    after = page["next"]
+        except (requests.exceptions.RequestException, RuntimeError) as e:
+            print(f"Cache warm-up stopped: {e}")
+
+        print(f"Warmed up the cache with {loaded} toys")
+        return loaded
+
+    # Fetch a toy again in the background after its cached item was served stale
+    def refresh_product(self, product_name):
+        self.refresh_executor.submit(self.run_refresh, product_name)
+
+    def run_refresh(self, product_name):
+        try:
+            self.query_product(product_name)
+        except (requests.exceptions.RequestException, RuntimeError) as e:
+            print(f"Refreshing {product_name} failed: {e}")
+        finally:
+            self.lrucache.refresh_done(product_name)
+
+    # Apply a change from the catalog to the cache, a change with the new price and quantity overwrites the cached item in place
+    def apply_change(self, change):
+        # A change may be a toy that was just added to the catalog
+        if self.negative_cache is not None:
+            self.negative_cache.invalidate(change["name"])
+        if "quantity" in change:
+            product = {"name": change["name"], "price": change["price"], "quantity": change["quantity"], "version": change["version"]}
+            self.lrucache.update(change["name"], {"data": product}, change["version"])
+        else:
+            self.lrucache.invalidate(change["name"], change.get("version"))
+
+    # Follow the change feed of one catalog shard and apply its changes to the cache in order
+    def follow_changes(self, catalog_address):
+        since, epoch = None, None
+        backoff = 0.1
+        while True:
+            params = {"timeout": 30}
+            if since is not None:
+                params.update(since=since, epoch=epoch)
+            try:
+                response = self.session.get(f"{catalog_address}/changes", params=params, timeout=(self.connect_timeout, 40))
+                feed = response.json()["data"]
+            except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+                # Resume from the same sequence number once the catalog is back
+                print(f"Change feed of {catalog_address} failed: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 5)
+                continue
+            backoff = 0.1
+
+            # Changes were missed, the cached items are revalidated on their next lookup
+            if feed["reset"]:
+                self.lrucache.invalidate_all()
+                if self.negative_cache is not None:
+                    self.negative_cache.invalidate_all()
+            for change in feed["changes"]:
+                self.apply_change(change)
+            since, epoch = feed["next"], feed["epoch"]
+
+    # Address of the catalog shard that owns the toy, toys are spread over the shards by the CRC32 of their name
+    def catalog_shard_address(self, product_name):
+        return self.catalog_addresses[zlib.crc32(product_name.encode()) % len(self.catalog_addresses)]
 
     # Function to query toy
     def query_product(self, product_name):
-        
+
+        # A toy the catalog did not have a moment ago
+        if self.negative_cache is not None and product_name in self.negative_cache:
+            return {"error": {"code": 404, "message": "Toy not found"}}
+
+        # The first miss on a toy fetches it, the others wait for its result
+        with self.inflight_lock:
+            flight = self.inflight.get(product_name)
+            leader = flight is None
+            if leader:
+                flight = self.inflight[product_name] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return flight.result()
+
+        try:
+            response = self.fetch_product(product_name)
+            flight.set_result(response)
+            return response
+        except Exception as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self.inflight_lock:
+                del self.inflight[product_name]
+
+    # Function to fetch a toy from the catalog
+    def fetch_product(self, product_name):
+
          # Forward the request to the catalog server
-        catalog_url = f"{self.catalog_address}/product/{product_name}"
-        response = requests.get(catalog_url)
+        catalog_url = f"{self.catalog_shard_address(product_name)}/product/{product_name}"
+
+        # A stale cached item is revalidated with its version, the catalog replies 304 without a body if it did not change
+        version = self.lrucache.version_of(product_name) if self.cache_or_not == True else None
+        try:
+            if version is not None:
+                response = self.session.get(catalog_url, headers={"If-None-Match": f'"{version}"'}, timeout=self.timeout)
+                if response.status_code == 304:
+                    cache_item = self.lrucache.revalidate(product_name, version)
+                    if cache_item != -1:
+                        return cache_item
+                    response = self.session.get(catalog_url, timeout=self.timeout)
+            else:
+                response = self.session.get(catalog_url, timeout=self.timeout)
+        # The catalog is down or overloaded, the waiters of the fetch get the same error
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching {product_name} from the catalog: {e}")
+            return {"error": {"code": 503, "message": "The catalog is not available"}}
 
         # Check the response 
         if response.status_code == 200:
             # Update the cache (if cache is used)
             json_response = response.json()
             if self.cache_or_not == True:
-                response = self.lrucache.put(product_name,json_response)
+                self.lrucache.put(product_name,json_response,json_response["data"].get("version"))
             return json_response
         
         # If the toy name does not exist in the catalog
         elif response.status_code == 404:
+            if self.negative_cache is not None:
+                self.negative_cache.add(product_name)
             resp_message = "Toy not found"
             error_response = {"error": {"code": response.status_code, "message": resp_message}}
             return error_response  
@@ -342,31 +922,111 @@ class FrontEndService(ThreadedHTTPServer):
             raise RuntimeError("Frontend should check the URL for the order service")
         
     
-    # Function to query the order number
-    def query_order_number(self,server,order_number):
+    # Function to query several toys, hits are served from the cache and the misses are fetched with one catalog request
+    def query_products(self, product_names):
 
-        response = None
-        while response == None:
+        products = {}
+        if self.cache_or_not == True:
+            for product_name in product_names:
+                cache_item = self.lrucache.get(product_name)
+                if cache_item != -1:
+                    products[product_name] = cache_item["data"]
+
+        not_found = []
+        misses = []
+        for product_name in dict.fromkeys(product_names):
+            if product_name in products:
+                continue
+            if self.negative_cache is not None and product_name in self.negative_cache:
+                not_found.append(product_name)
+            else:
+                misses.append(product_name)
+
+        # One catalog request per shard that owns some of the misses
+        shard_misses = {}
+        for product_name in misses:
+            shard_misses.setdefault(self.catalog_shard_address(product_name), []).append(product_name)
+
+        for catalog_address, names in shard_misses.items():
             try:
+                response = self.session.get(f"{catalog_address}/products", params={"names": ",".join(names)}, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                print(f"Error querying toys from the catalog at {catalog_address}: {e}")
+                return {"error": {"code": 503, "message": "The catalog is not available"}}
+            if response.status_code != 200:
+                raise RuntimeError("Frontend should check the URL for the catalog service")
+
+            json_response = response.json()
+            for product in json_response["data"]:
+                products[product["name"]] = product
+                # Update the cache (if cache is used)
+                if self.cache_or_not == True:
+                    self.lrucache.put(product["name"], {"data": product}, product.get("version"))
+            not_found.extend(json_response["not_found"])
+            if self.negative_cache is not None:
+                for product_name in json_response["not_found"]:
+                    self.negative_cache.add(product_name)
+
+        return {"data": [products[product_name] for product_name in product_names if product_name in products], "not_found": not_found}
 
-                print("self.server.leader_id: ",server.leader_id)
-                order_port = os.getenv(f"ORDER_PORT_{server.leader_id}")
-                order_host = os.getenv(f"ORDER_HOST_{server.leader_id}")
-                leader_host, leader_port = order_host, order_port 
-                # Forward the request to the order server
-                order_url =  f"http://{leader_host}:{leader_port}/orders/{order_number}"
-                print("order_query_url: ",order_url)
-                response = requests.get(order_url)
+    # Function to list a page of the catalog, the pages of the shards are merged in name order
+    def list_products(self, after, limit):
 
+        products = []
+        more = False
+        for catalog_address in self.catalog_addresses:
+            try:
+                response = self.session.get(f"{catalog_address}/products", params={"after": after, "limit": limit}, timeout=self.timeout)
             except requests.exceptions.RequestException as e:
-                # Passive health check
-                print(f'An request exception occurs: {e}. Re-select a leader.')
-                with server.rwlock.w_locked():
-                    leader_selection(server)
+                print(f"Error listing toys from the catalog at {catalog_address}: {e}")
+                return {"error": {"code": 503, "message": "The catalog is not available"}}
+            if response.status_code != 200:
+                raise RuntimeError("Frontend should check the URL for the catalog service")
+            json_response = response.json()
+            products.extend(json_response["data"])
+            more = more or json_response["next"] is not None
+
+        if len(self.catalog_addresses) == 1:
+            return json_response
+
+        products.sort(key=lambda product: product["name"])
+        more = more or len(products) > limit
+        products = products[:limit]
+        return {"data": products, "next": products[-1]["name"] if more and len(products) > 0 else None}
+
+    # Function to query the order number
+    def query_order_number(self,server,order_number):
+
+        if server.order_cache is not None:
+            cache_item = server.order_cache.get(str(order_number))
+            if cache_item != -1:
+                return cache_item
+
+        # Read from the next replica that is up. The order number is the position the replica must have applied,
+        # a replica that is behind waits for it or redirects to the leader.
+        response = None
+        if server.follower_reads:
+            with server.leader_cond:
+                replicas = sorted(server.alive)
+            if replicas:
+                replica_id = replicas[next(server.read_counter) % len(replicas)]
+                try:
+                    response = server.session.get(f"{server.order_addresses[replica_id]}/orders/{order_number}",
+                                                  params={"min_position": order_number}, timeout=server.timeout)
+                except requests.exceptions.RequestException as e:
+                    print(f"Order lookup on replica {replica_id} failed: {e}")
+
+        # Only the leader answers for orders the replicas do not have
+        if response is None or response.status_code != 200:
+            response = server.leader_request("GET", f"/orders/{order_number}")
+        if response is None:
+            return {"error": {"code": 503, "message": "No order service is available"}}
 
         # If the order number exists
         if response.status_code == 200:
             json_response = response.json()
+            if server.order_cache is not None:
+                server.order_cache.put(str(order_number), json_response)
             return json_response  
         
         # If the order number does not exist
@@ -382,27 +1042,22 @@ class FrontEndService(ThreadedHTTPServer):
     # Function to place an order
     def place_order(self, server,order_data):
 
-        response = None
-        while response == None:
-            try:
+        try:
+            response = server.leader_request("POST", "/orders", data=order_data)
+        # The leader did not answer in time, sending the order again could place it twice
+        except requests.exceptions.RequestException:
+            return {"error": {"code": 504, "message": "The order service did not answer in time, the order may have been placed"}}
+        if response is None:
+            return {"error": {"code": 503, "message": "No order service is available"}}
 
-                print("self.server.leader_id: ",server.leader_id)
-                order_port = os.getenv(f"ORDER_PORT_{server.leader_id}")
-                order_host = os.getenv(f"ORDER_HOST_{server.leader_id}")
-                leader_host, leader_port = order_host, order_port 
-                order_url =  f"http://{leader_host}:{leader_port}/orders"
-                print("order_buy_url", order_url)
-                response = requests.post(order_url, data=order_data)
-                
-            except requests.exceptions.RequestException as e:
-                # Passive health check
-                print(f'An request exception occurs: {e}. Re-select a leader.')
-                with server.rwlock.w_locked():
-                    leader_selection(server)
-        
         #Order successfully
         if response.status_code == 200:
             json_response = response.json()
+            # Cache the order as a lookup would return it
+            if server.order_cache is not None:
+                order_number = json_response["data"]["order_number"]
+                server.order_cache.put(str(order_number), {"data": {"Order number": str(order_number), "Toy name": order_data["name"],
+                                                                    "Quantity": float(order_data["quantity"])}})
             return json_response 
         
         #Invalid Quantity 
@@ -410,11 +1065,49 @@ class FrontEndService(ThreadedHTTPServer):
             resp_message = (f"Sorry {order_data['name']} is out of stock or invalid quantity")
             error_response = {"error": {"code": response.status_code, "message": resp_message}}
             return error_response  
+
+        #The catalog or the replicas could not be reached, the order is not placed
+        elif response.status_code == 503:
+            return {"error": {"code": 503, "message": f"Sorry {order_data['name']} could not be ordered, try again later"}}
         
         # If the URL is invalid
         else:
             raise RuntimeError("Frontend should check the URL and the requested quantity for the order service")
 
+    # Function to place an order for a cart
+    def place_cart(self, server, cart_data):
+
+        try:
+            response = server.leader_request("POST", "/orders/batch", json={"items": cart_data["items"]})
+        # The leader did not answer in time, sending the order again could place it twice
+        except requests.exceptions.RequestException:
+            return {"error": {"code": 504, "message": "The order service did not answer in time, the cart may have been placed"}}
+        if response is None:
+            return {"error": {"code": 503, "message": "No order service is available"}}
+
+        #Cart ordered successfully
+        if response.status_code == 200:
+            json_response = response.json()
+            return json_response
+
+        #Unknown toy, out of stock or invalid quantity in the cart
+        elif response.status_code == 400:
+            resp_message = "Sorry some toys in the cart are out of stock or have an invalid quantity"
+            error_response = {"error": {"code": response.status_code, "message": resp_message}}
+            return error_response
+
+        #The catalog or the replicas could not be reached, no toy of the cart is ordered
+        elif response.status_code == 503:
+            return {"error": {"code": 503, "message": "Sorry the cart could not be ordered, try again later"}}
+
+        #A catalog shard failed to commit after other shards had ordered their toys
+        elif response.status_code == 500:
+            return {"error": {"code": 500, "message": "Sorry only part of the cart could be ordered and no order numbers were given"}}
+
+        # If the URL is invalid
+        else:
+            raise RuntimeError("Frontend should check the URL and the requested quantities for the order service")
+
 
 if __name__ == "__main__":
 
@@ -423,30 +1116,93 @@ if __name__ == "__main__":
     catalog_port = int(os.getenv("catalog_PORT"))
     catalog_host = os.getenv("catalog_host")
     catalog_service_address = f"http://{catalog_host}:{catalog_port}"
+    # Shard i of the catalog listens on catalog_PORT + i
+    catalog_shards = int(os.getenv("catalog_shards", 1))
+    catalog_shard_addresses = [f"http://{catalog_host}:{catalog_port + shard}" for shard in range(catalog_shards)]
 
     order_ids = [
             int(os.getenv("ORDER_ID_1")),
             int(os.getenv("ORDER_ID_2")),
             int(os.getenv("ORDER_ID_3"))
         ]
+    # Connection pool per backend and timeouts in seconds for the calls to the catalog and the order services
+    pool_size = int(os.getenv("frontend_pool_size", 32))
+    connect_timeout = float(os.getenv("frontend_connect_timeout", 1))
+    read_timeout = float(os.getenv("frontend_read_timeout", 10))
 
     CACHE_SIZE =os.getenv("cache_size")
     CACHE = os.getenv("cache_include")
     # Convert the string value to a boolean
     CACHE = CACHE.lower() == 'true' 
+    # Number of independently locked segments of the cache
+    CACHE_SEGMENTS = int(os.getenv("cache_segments", 16))
+    # Admission policy of the cache: "lru" or "tinylfu"
+    CACHE_POLICY = os.getenv("cache_policy", "lru")
+    # Seconds a cached toy is fresh (0 keeps it until it is evicted or invalidated) and is served stale while it is refreshed
+    CACHE_TTL = float(os.getenv("cache_ttl", 0))
+    CACHE_STALE_TTL = float(os.getenv("cache_stale_ttl", 0))
+    # Number of unknown toy names remembered (0 turns this off) and the seconds each is remembered
+    NEGATIVE_CACHE_SIZE = int(os.getenv("cache_negative_size", 1000))
+    NEGATIVE_CACHE_TTL = float(os.getenv("cache_negative_ttl", 5))
+    # How the cache learns about changes: "push" (the catalog posts to /invalidate) or "feed" (follow the catalog /changes feed)
+    invalidation_mode = os.getenv("cache_invalidation_mode", "push")
+    # Fill the cache before serving, and the file and interval in seconds of the cache snapshots (no file turns them off)
+    CACHE_WARMUP = os.getenv("cache_warmup", "true").lower() == "true"
+    CACHE_SNAPSHOT_FILE = os.getenv("cache_snapshot_file") or None
+    CACHE_SNAPSHOT_INTERVAL = float(os.getenv("cache_snapshot_interval", 60))
+    # Seconds between health checks of the order replicas, timeout of one check, and the longest a request waits for a leader
+    health_check_interval = float(os.getenv("frontend_health_check_interval", 0.5))
+    health_check_timeout = float(os.getenv("frontend_health_check_timeout", 0.2))
+    health_check_failures = int(os.getenv("frontend_health_check_failures", 2))
+    leader_wait = float(os.getenv("frontend_leader_wait", 2))
+    # Spread order lookups over all order replicas instead of sending them to the leader
+    follower_reads = os.getenv("frontend_follower_reads", "true").lower() == "true"
+    # Number of order records cached (0 turns the order cache off)
+    order_cache_size = int(os.getenv("order_cache_size", 10000))
 
     # Set up the threaded HTTP server with the given port and request handler.
     front_end_service = FrontEndService(
         port=frontend_port,
         catalog_address=catalog_service_address,
+        catalog_addresses=catalog_shard_addresses,
+        invalidation_mode=invalidation_mode,
         order_ids=order_ids,
+        pool_size=pool_size,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        health_check_interval=health_check_interval,
+        health_check_timeout=health_check_timeout,
+        health_check_failures=health_check_failures,
+        leader_wait=leader_wait,
+        follower_reads=follower_reads,
+        order_cache_size=order_cache_size,
         cache_s = CACHE_SIZE,
-        c = CACHE
+        c = CACHE,
+        cache_segments = CACHE_SEGMENTS,
+        cache_ttl = CACHE_TTL,
+        cache_stale_ttl = CACHE_STALE_TTL,
+        negative_cache_size = NEGATIVE_CACHE_SIZE,
+        negative_cache_ttl = NEGATIVE_CACHE_TTL,
+        cache_snapshot_file = CACHE_SNAPSHOT_FILE,
+        cache_snapshot_interval = CACHE_SNAPSHOT_INTERVAL,
+        cache_policy = CACHE_POLICY
     )
-    # Select the leader order service
-    leader_selection(front_end_service)
+    # Keep track of the leader order service in the background
+    front_end_service.start_health_monitor()
+
+    if CACHE_WARMUP:
+        front_end_service.warm_up()
 
     print(f"Serving on port {frontend_port}")
 
+    # Stop on SIGTERM like on Ctrl-C, so the last cache snapshot is written
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
     # Start serving requests.
-    front_end_service.serve_forever()  
+    try:
+        front_end_service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if front_end_service.cache_snapshot_file:
+            front_end_service.save_cache_snapshot()  
@@ -5,7 +5,7 @@ from dotenv import load_dotenv
 from http.server import HTTPServer
 from socketserver import ThreadingMixIn
 from contextlib import contextmanager
-from threading import Lock
+from threading import Lock, Condition
 import csv
 import socket
 import requests
@@ -14,6 +14,7 @@ from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import parse_qs,urlparse
 import argparse
 import time
+import zlib
 
 
 load_dotenv()
@@ -86,7 +87,7 @@ def init_order(csv_file: str, order: dict):
             with open(csv_file, "r") as file:
                 reader = csv.DictReader(file)
                 for row in reader:
-                    order_n = row["Order Number"]
+                    order_n = int(row["Order Number"])
                     toyname = row["Toy Name"]
                     quantity = float(row["Quantity"])
                     order[order_n] = {"Toy Name": toyname, "Quantity": quantity}
@@ -100,7 +101,8 @@ def update_csv(order_number, product_name, update_quantity):
     else:
         mode = "w"  
     
-    order[order_number] = {'Toy Name': product_name, 'Quantity': update_quantity}
+    order[int(order_number)] = {'Toy Name': product_name, 'Quantity': update_quantity}
+    advance_position()
     with open(csv_file, mode=mode, newline="") as file:
         fieldnames = ["Order Number", "Toy Name", "Quantity"]
         writer = csv.DictWriter(file, fieldnames=fieldnames)
@@ -110,11 +112,24 @@ def update_csv(order_number, product_name, update_quantity):
             {"Order Number": order_number, "Toy Name": product_name, "Quantity": update_quantity}
         )
 
+#Move the applied position past the orders this replica has without a gap and wake up the readers waiting for it.
+def advance_position():
+    global applied_position
+    with applied_cond:
+        while applied_position + 1 in order:
+            applied_position += 1
+        applied_cond.notify_all()
+
 #Lookup order number in the order dictionary.
 def order_lookup(ordern):
     rwlock = RWLock()
+    # An order number that is not a number is not found
+    try:
+        ordern = int(ordern)
+    except ValueError:
+        return -1
     with rwlock.r_locked():
-        if int(ordern) in order:        
+        if ordern in order:        
                 return 1
         return -1
 
@@ -162,6 +177,67 @@ def get_missed_orders_from_updated_replica(replica_last_order_number):
                 missed_orders.append(row)
     return missed_orders 
 
+# Address of the catalog shard that owns the toy, toys are spread over the shards by the CRC32 of their name
+def catalog_shard_address(toy_name):
+    shard = zlib.crc32(toy_name.encode()) % catalog_shards
+    return f"http://{catalog_host}:{int(catalog_PORT) + shard}"
+
+# Order a cart in the catalog. A cart owned by one shard is sent with one /orders/batch request and ordered all-or-nothing,
+# a cart spanning shards is first held with one /reserve request per shard and then committed.
+# Returns the status for the cart: 200 ordered, 400 rejected by the catalog, 503 catalog not reachable
+# and 500 when a shard fails to commit after other shards already ordered their toys.
+def order_cart_in_catalog(items):
+    shard_carts = {}
+    for toy_name, quant in items:
+        shard_carts.setdefault(catalog_shard_address(toy_name), []).append({"name": toy_name, "quantity": quant})
+
+    if len(shard_carts) == 1:
+        address, cart = next(iter(shard_carts.items()))
+        try:
+            return 200 if requests.post(f"{address}/orders/batch", json={"items": cart}).status_code == 200 else 400
+        except requests.exceptions.RequestException as e:
+            print(f"Error ordering cart at {address}: {e}")
+            return 503
+
+    reservations = []
+    try:
+        for address, cart in shard_carts.items():
+            response = requests.post(f"{address}/reserve", json={"items": cart})
+            if response.status_code != 200:
+                release_in_catalog(reservations)
+                return 400
+            reservations.append((address, response.json()["data"]["reservation_id"]))
+    except requests.exceptions.RequestException as e:
+        print(f"Error reserving cart at {address}: {e}")
+        release_in_catalog(reservations)
+        return 503
+    return commit_in_catalog(reservations)
+
+# Order the held toys shard by shard. On the first shard that fails, the reservations not committed yet are released.
+# Returns 200 if every shard committed, 400/503 if nothing was ordered and 500 if earlier shards already ordered their toys.
+def commit_in_catalog(reservations):
+    for i, (address, reservation_id) in enumerate(reservations):
+        try:
+            status = 200 if requests.post(f"{address}/commit/{reservation_id}").status_code == 200 else 400
+        except requests.exceptions.RequestException as e:
+            print(f"Error committing reservation {reservation_id} at {address}: {e}")
+            status = 503
+        if status != 200:
+            release_in_catalog(reservations[i:])
+            if i > 0:
+                print(f"Cart partially ordered, committed reservations {reservations[:i]}, released {reservations[i:]}")
+                return 500
+            return status
+    return 200
+
+# Give the held toys back, a reservation that cannot be released expires in the catalog
+def release_in_catalog(reservations):
+    for address, reservation_id in reservations:
+        try:
+            requests.post(f"{address}/release/{reservation_id}")
+        except requests.exceptions.RequestException as e:
+            print(f"Error releasing reservation {reservation_id} at {address}: {e}")
+
 #Order Server class for managing orders and serving HTTP requests.
 class OrderRequestHandler(http.server.BaseHTTPRequestHandler):
 
@@ -169,7 +245,7 @@ class OrderRequestHandler(http.server.BaseHTTPRequestHandler):
     def do_POST(self):
 
         rwlock = RWLock()
-        global order_number, leader_address
+        global order_number, leader_address, is_leader
         
         """
         URL FLOW:
@@ -184,8 +260,60 @@ class OrderRequestHandler(http.server.BaseHTTPRequestHandler):
             and then replicates the order to all other replicas by sending POST requests to their respective /replicate_order endpoints, where the replicas 
             update their own database.
         """
+        # Place a whole cart, every line of the cart gets its own order number
+        if self.path == "/orders/batch":
+
+            content_length = int(self.headers["Content-Length"])
+            # A body that cannot be parsed is an invalid cart
+            try:
+                request_body = json.loads(self.rfile.read(content_length))
+                items = [(item["name"], float(item["quantity"])) for item in request_body.get("items", [])]
+            except (ValueError, KeyError, TypeError, AttributeError):
+                items = []
+
+            #Check for valid quantities
+            if len(items) > 0 and all(isinstance(toy_name, str) and toy_name and quant > 0 for toy_name, quant in items):
+
+                #Forward the cart to the catalog shards that own its toys
+                status = order_cart_in_catalog(items)
+                if status == 200:
+                    with self.server.rwlock.w_locked():
+                        placed_orders = []
+                        for toy_name, quant in items:
+                            order_number += 1
+                            update_csv(order_number, toy_name, quant)
+                            placed_orders.append({"order_number": order_number, "name": toy_name, "quantity": quant})
+
+                    #Cart is successful, send its orders to the replicas as well.
+                    for follower_node_address in self.server.follower_addresses:
+                        try:
+                            if follower_node_address != current_server_address:
+                                replica_response = requests.post(f"{follower_node_address}/replicate_order", json={"orders": placed_orders})
+                                if replica_response.status_code == 200:
+                                    print(f"Orders replicated to replica at {follower_node_address}")
+                                else:
+                                    print(f"Failed to replicate orders to replica at {follower_node_address}")
+                        except requests.exceptions.RequestException as e:
+                            print(f"Error replicating orders to replica at {follower_node_address}: {e}")
+
+                    self.send_response(200)
+                    self.send_header("Content-type", "application/json")
+                    self.end_headers()
+                    response_data = {"data": {"order_numbers": [placed["order_number"] for placed in placed_orders]}}
+                    self.wfile.write(json.dumps(response_data).encode())
+                else:
+                    self.send_response(status)
+                    self.send_header("Content-type", "application/json")
+                    self.end_headers()
+
+            # Empty cart or invalid quantity i.e quantity <= 0
+            else:
+                self.send_response(400)
+                self.send_header("Content-type", "application/json")
+                self.end_headers()
+
         # Check the validity of URL
-        if self.path.startswith("/orders"):  
+        elif self.path.startswith("/orders"):  
             if len(self.server.follower_addresses) > 0:
                 try:
                     for follower_node_address in self.server.follower_addresses:
@@ -206,18 +334,25 @@ class OrderRequestHandler(http.server.BaseHTTPRequestHandler):
             # Parse the request to get the toy name, quantity
             parsed_body = parse_qs(request_body)
             toy_name = parsed_body.get("name", [None])[0]
-            quant = float(parsed_body.get("quantity", [0])[0])
+            try:
+                quant = float(parsed_body.get("quantity", [0])[0])
+            except ValueError:
+                quant = 0
             
             #Check for valid quantity
-            if quant > 0:
+            if toy_name and quant > 0:
 
                 #Forward request to catalog service to check
-                base_url = f"http://{catalog_host}:{catalog_PORT}"
+                base_url = catalog_shard_address(toy_name)
                 url = f"{base_url}/orders/{toy_name}/{quant}"
-                response = requests.post(url)
+                try:
+                    status = 200 if requests.post(url).status_code == 200 else 400
+                except requests.exceptions.RequestException as e:
+                    print(f"Error ordering {toy_name} at {base_url}: {e}")
+                    status = 503
                     
                 # Send the appropriate response based on the result of the order operation
-                if response.status_code == 200:
+                if status == 200:
                     with rwlock.w_locked():
                         order_number += 1
                         current_order_number = order_number
@@ -253,7 +388,7 @@ class OrderRequestHandler(http.server.BaseHTTPRequestHandler):
                         response_json = json.dumps(response_data)
                         self.wfile.write(response_json.encode())
                 else:
-                    self.send_response(400)
+                    self.send_response(status)
                     self.send_header("Content-type", "application/json")
                     self.end_headers()
 
@@ -279,6 +414,7 @@ class OrderRequestHandler(http.server.BaseHTTPRequestHandler):
             leader_address = f"http://{leader_host}:{leader_port}"
 
             print(f'Order ID {leader_id} is the leader now.')
+            is_leader = False
             
             self.send_response(200)
             self.end_headers()
@@ -299,6 +435,7 @@ class OrderRequestHandler(http.server.BaseHTTPRequestHandler):
             print(message)
             if message == "You win":
                 print('I am the leader now.')
+                is_leader = True
                 self.send_response(200)
                 self.end_headers()
                 self.wfile.write(json.dumps({'message': f'From Leader: Leader ID {leader_id} selected.'}).encode('utf-8'))
@@ -309,13 +446,11 @@ class OrderRequestHandler(http.server.BaseHTTPRequestHandler):
             content_length = int(self.headers['Content-Length'])
             request_body = self.rfile.read(content_length).decode()
             parsed_body = json.loads(request_body)
-            order_number = parsed_body.get("order_number")
-            name = parsed_body.get("name")
-            quantity = parsed_body.get("quantity")
-            # print("order_number", order_number, "toy_name", name, "quant", quantity)
-            #To update in the replicas 
-            
-            update_csv(order_number, name, quantity)
+
+            #To update in the replicas, either a single order or all orders of a cart
+            for replicated in parsed_body.get("orders", [parsed_body]):
+                order_number = replicated.get("order_number")
+                update_csv(order_number, replicated.get("name"), replicated.get("quantity"))
             self.send_response(200)    
             self.send_header("Content-type", "application/json")
             self.end_headers()
@@ -330,8 +465,30 @@ class OrderRequestHandler(http.server.BaseHTTPRequestHandler):
         # If the request is for order lookup
         if self.path.startswith("/orders"):
 
-            # Parse the toy name from the request URL
-            order_no = self.path.split("/")[-1]
+            # Parse the order number from the request URL
+            url = urlparse(self.path)
+            order_no = url.path.split("/")[-1]
+
+            # A read sent to a follower carries the order number it needs (min_position). A follower that
+            # has not applied it yet waits briefly for replication, then sends the reader to the leader.
+            query_params = parse_qs(url.query)
+            if "min_position" in query_params and not is_leader:
+                try:
+                    min_position = int(query_params["min_position"][0])
+                except ValueError:
+                    self.send_response(400)
+                    self.send_header("Content-type", "application/json")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                with applied_cond:
+                    caught_up = applied_cond.wait_for(lambda: applied_position >= min_position, follower_read_wait)
+                if not caught_up and leader_address:
+                    self.send_response(307)
+                    self.send_header("Location", f"{leader_address}{self.path}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
 
             # Order number lookup
             res = order_lookup(order_no)
@@ -425,6 +582,7 @@ class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
 
         #Initialize in memory DB
         init_order(csv_file, order)
+        advance_position()
         self.follower_addresses = []
         for follower_id in range(1,4):  # Assuming 3 follower nodes
             follower_order_host = os.getenv(f"ORDER_HOST_{follower_id}")
@@ -469,8 +627,18 @@ if __name__ == "__main__":
 
     current_server_address = f"http://{order_host}:{order_PORT}"
     order = {}
+    # Highest order number up to which this replica has every order
+    applied_position = 0
+    applied_cond = Condition()
+    # Set by the frontend through /leaderselection and /inform_replica
+    leader_address = None
+    is_leader = False
+    # Seconds a follower waits for an order to be replicated before it sends the reader to the leader
+    follower_read_wait = float(os.getenv("order_follower_read_wait", 0.2))
    
     catalog_host = os.getenv("catalog_host")
     catalog_PORT = os.getenv("catalog_PORT")
+    # Shard i of the catalog listens on catalog_PORT + i
+    catalog_shards = int(os.getenv("catalog_shards", 1))
     print("Catalog Host:", catalog_host, "Catalog Port", catalog_PORT, "order_PORT: ",order_PORT)
     main(int(order_PORT), csv_file)
\ No newline at end of file
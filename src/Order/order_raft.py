@@ -5,7 +5,7 @@ from dotenv import load_dotenv
 from http.server import HTTPServer
 from socketserver import ThreadingMixIn
 from contextlib import contextmanager
-from threading import Lock
+from threading import Lock, Condition
 import csv
 import requests
 import multiprocessing
@@ -14,6 +14,7 @@ from urllib.parse import parse_qs,urlparse
 import argparse
 from datetime import datetime
 import threading
+import zlib
 
 load_dotenv()
 
@@ -214,7 +215,7 @@ def init_order(csv_file: str, order: dict):
             with open(csv_file, "r") as file:
                 reader = csv.DictReader(file)
                 for row in reader:
-                    order_n = row["Order Number"]
+                    order_n = int(row["Order Number"])
                     toyname = row["Toy Name"]
                     quantity = float(row["Quantity"])
                     order[order_n] = {"Toy Name": toyname, "Quantity": quantity}
@@ -228,7 +229,8 @@ def update_csv(order_number, product_name, update_quantity):
     else:
         mode = "w"  
     
-    order[order_number] = {'Toy Name': product_name, 'Quantity': update_quantity}
+    order[int(order_number)] = {'Toy Name': product_name, 'Quantity': update_quantity}
+    advance_position()
     with open(csv_file, mode=mode, newline="") as file:
         fieldnames = ["Order Number", "Toy Name", "Quantity"]
         writer = csv.DictWriter(file, fieldnames=fieldnames)
@@ -238,11 +240,24 @@ def update_csv(order_number, product_name, update_quantity):
             {"Order Number": order_number, "Toy Name": product_name, "Quantity": update_quantity}
         )
 
+#Move the applied position past the orders this replica has without a gap and wake up the readers waiting for it.
+def advance_position():
+    global applied_position
+    with applied_cond:
+        while applied_position + 1 in order:
+            applied_position += 1
+        applied_cond.notify_all()
+
 #Lookup order number in the order dictionary.
 def order_lookup(ordern):
     rwlock = RWLock()
+    # An order number that is not a number is not found
+    try:
+        ordern = int(ordern)
+    except ValueError:
+        return -1
     with rwlock.r_locked():
-        if int(ordern) in order:        
+        if ordern in order:        
                 return 1
         return -1
 
@@ -265,6 +280,103 @@ def get_last_line_number(file_path):
                     sum += 1
                 return sum
 
+# Ask the replicas that appended the last log entry to delete it again after a failed replication
+def rollback_replica_logs(raft_replica_address, failed_follower):
+    rwlock = RWLock()
+    v = float('inf')
+    # Used to get last line number from replicas to delete. This can be done dynamically in future.
+    for i in range(1,4):
+        res=get_last_line_number(f"log{i}.txt")
+        print("Minimum line number1: ",res)                        
+        res=min(res,v)
+
+    print("Minimum line number2: ",res)
+
+    print("raft_replica_address: ",raft_replica_address, len(raft_replica_address))
+
+    with rwlock.w_locked():
+        for addr in raft_replica_address:
+            if addr not in failed_follower:
+                print("Failed follower addr: ",failed_follower)
+                print("Replica addr to delete extra lines: ",addr)
+                url = f"{addr}/deletelastline"
+                print("Delete url: ",url)
+                request_body = {"line_number" : res}
+                request_body_json = json.dumps(request_body)
+                try:
+                        response = requests.post(url, data=request_body_json)
+                        if response.status_code == 200:
+                            print("Success: Last line deleted")
+                        else:
+                            print(f'An unexpected status code received: {response.status_code}')
+                except requests.RequestException as e:
+                    print(f'An exception occurred while sending the request to {addr}: {e}')
+
+# Send successful orders to the follower nodes in one request per node
+def replicate_orders(raft_replica_address, orders):
+    for node in raft_replica_address:
+        try:
+            replica_url = f"{node}/replicate_data_nodes"
+            replica_response = requests.post(replica_url, json={"orders": orders})
+            if replica_response.status_code == 200:
+                print(f"Orders replicated to replica at {node}")
+            else:
+                print(f"Failed to replicate orders to replica at {node}")
+        except requests.exceptions.RequestException as e:
+            print(f"Error replicating orders to replica at {node}: {e}")
+
+# Address of the catalog shard that owns the toy, toys are spread over the shards by the CRC32 of their name
+def catalog_shard_address(toy_name):
+    shard = zlib.crc32(toy_name.encode()) % catalog_shards
+    return f"http://{catalog_host}:{int(catalog_PORT) + shard}"
+
+# Hold the toys of a cart in the catalog with one /reserve request per shard that owns toys of the cart.
+# Returns the status and the (shard address, reservation id) pairs. If some toy could not be held (400)
+# or a shard is not reachable (503) the reservations are None, the holds already taken are then released.
+def reserve_in_catalog(items):
+    shard_carts = {}
+    for toy_name, quant in items:
+        shard_carts.setdefault(catalog_shard_address(toy_name), []).append({"name": toy_name, "quantity": quant})
+
+    reservations = []
+    try:
+        for address, cart in shard_carts.items():
+            response = requests.post(f"{address}/reserve", json={"items": cart})
+            if response.status_code != 200:
+                release_in_catalog(reservations)
+                return 400, None
+            reservations.append((address, response.json()["data"]["reservation_id"]))
+    except requests.exceptions.RequestException as e:
+        print(f"Error reserving toys at {address}: {e}")
+        release_in_catalog(reservations)
+        return 503, None
+    return 200, reservations
+
+# Order the held toys shard by shard. On the first shard that fails, the reservations not committed yet are released.
+# Returns 200 if every shard committed, 400/503 if nothing was ordered and 500 if earlier shards already ordered their toys.
+def commit_in_catalog(reservations):
+    for i, (address, reservation_id) in enumerate(reservations):
+        try:
+            status = 200 if requests.post(f"{address}/commit/{reservation_id}").status_code == 200 else 400
+        except requests.exceptions.RequestException as e:
+            print(f"Error committing reservation {reservation_id} at {address}: {e}")
+            status = 503
+        if status != 200:
+            release_in_catalog(reservations[i:])
+            if i > 0:
+                print(f"Cart partially ordered, committed reservations {reservations[:i]}, released {reservations[i:]}")
+                return 500
+            return status
+    return 200
+
+# Give the held toys back, a reservation that cannot be released expires in the catalog
+def release_in_catalog(reservations):
+    for address, reservation_id in reservations:
+        try:
+            requests.post(f"{address}/release/{reservation_id}")
+        except requests.exceptions.RequestException as e:
+            print(f"Error releasing reservation {reservation_id} at {address}: {e}")
+
 #Order Server class for managing orders and serving HTTP requests.
 class OrderRequestHandler(http.server.BaseHTTPRequestHandler):
 
@@ -272,15 +384,89 @@ class OrderRequestHandler(http.server.BaseHTTPRequestHandler):
     def do_POST(self):
 
         rwlock = RWLock()
-        global order_number, leader_address
+        global order_number, leader_address, is_leader
         
         """
         First leader send log details to follower nodes and wait for the response from them if they have appended the entry or not. 
         If yes then the leader commits the log and tells the same to followers and followers also commits
         """
         
+        # Place a whole cart, every line of the cart gets its own order number
+        if self.path == "/orders/batch":
+
+            content_length = int(self.headers["Content-Length"])
+            # A body that cannot be parsed is an invalid cart
+            try:
+                request_body = json.loads(self.rfile.read(content_length))
+                items = [(item["name"], float(item["quantity"])) for item in request_body.get("items", [])]
+            except (ValueError, KeyError, TypeError, AttributeError):
+                items = []
+
+            #Check for valid quantities
+            if len(items) > 0 and all(isinstance(toy_name, str) and toy_name and quant > 0 for toy_name, quant in items):
+
+                # Log the whole cart as one event and append it in follower nodes
+                term = self.server.raft_instance.get_lastterm()
+                index = self.server.raft_instance.fetch_replica_last_log()
+                details = ";".join(f"{toy_name},{quant}" for toy_name, quant in items)
+                entries = {
+                            "term": term,
+                            "event_type": "CART REQUESTED",
+                            "details": details,
+                            "index": index
+                          }
+                raft_replica_address = self.server.raft_instance.follower_addr()
+                # Hold the toys in the catalog while the log entry is replicated
+                reservation = self.server.executer.submit(reserve_in_catalog, items)
+                failed_follower,value = self.server.raft_instance.replicate_logs(entries,raft_replica_address)
+                status, reservations = reservation.result()
+
+                if value != True:
+                    rollback_replica_logs(raft_replica_address, failed_follower)
+                    # The cart is not ordered, give its toys back
+                    if reservations is not None:
+                        release_in_catalog(reservations)
+                    self.send_response(503)
+                    self.send_header("Content-type", "application/json")
+                    self.end_headers()
+
+                else:
+                    # Append in leader node
+                    self.server.raft_instance.append_log_entry(term, "CART REQUESTED", details)
+
+                    #Order the held toys once a majority has the log entry
+                    if status == 200:
+                        status = commit_in_catalog(reservations)
+                    if status == 200:
+                        with self.server.rwlock.w_locked():
+                            placed_orders = []
+                            for toy_name, quant in items:
+                                order_number += 1
+                                update_csv(order_number, toy_name, quant)
+                                placed_orders.append({"order_number": order_number, "name": toy_name, "quantity": quant})
+
+                        #Cart is successful, send its orders to the replicas as well.
+                        replicate_orders(raft_replica_address, placed_orders)
+
+                        self.send_response(200)
+                        self.send_header("Content-type", "application/json")
+                        self.end_headers()
+                        response_data = {"data": {"order_numbers": [placed["order_number"] for placed in placed_orders]}}
+                        self.wfile.write(json.dumps(response_data).encode())
+
+                    else:
+                        self.send_response(status)
+                        self.send_header("Content-type", "application/json")
+                        self.end_headers()
+
+            # Empty cart or invalid quantity i.e quantity <= 0
+            else:
+                self.send_response(400)
+                self.send_header("Content-type", "application/json")
+                self.end_headers()
+
         # Check the validity of URL
-        if self.path.startswith("/orders"):  
+        elif self.path.startswith("/orders"):  
         
             print("POST req")
 
@@ -290,10 +476,13 @@ class OrderRequestHandler(http.server.BaseHTTPRequestHandler):
             # Parse the request to get the toy name, quantity
             parsed_body = parse_qs(request_body)
             toy_name = parsed_body.get("name", [None])[0]
-            quant = float(parsed_body.get("quantity", [0])[0])
+            try:
+                quant = float(parsed_body.get("quantity", [0])[0])
+            except ValueError:
+                quant = 0
             
             #Check for valid quantity
-            if quant > 0:
+            if toy_name and quant > 0:
                 
                 # Log the event 
                 term = self.server.raft_instance.get_lastterm()
@@ -307,41 +496,20 @@ class OrderRequestHandler(http.server.BaseHTTPRequestHandler):
                           }
                 print("entries",entries)
                 raft_replica_address = self.server.raft_instance.follower_addr()
+                # Hold the toy in the catalog while the log entry is replicated
+                reservation = self.server.executer.submit(reserve_in_catalog, [(toy_name, quant)])
                 failed_follower,value = self.server.raft_instance.replicate_logs(entries,raft_replica_address)
+                status, reservations = reservation.result()
                 print("Appended or not: ",value)
 
                 # If more than half nodes return success response proceed further else client has to be notified that the order failed.
                 if value != True:
                     print("NOT TRUE")
-                    v = float('inf')
-                    # Used to get last line number from replicas to delete. This can be done dynamically in future.
-                    for i in range(1,4):
-                        res=get_last_line_number(f"log{i}.txt")
-                        print("Minimum line number1: ",res)                        
-                        res=min(res,v)
-
-                    print("Minimum line number2: ",res)
-
-                    print("raft_replica_address: ",raft_replica_address, len(raft_replica_address))
-
-                    with rwlock.w_locked():
-                        for addr in raft_replica_address:
-                            if addr not in failed_follower:
-                                print("Failed follower addr: ",failed_follower)
-                                print("Replica addr to delete extra lines: ",addr)
-                                url = f"{addr}/deletelastline"
-                                print("Delete url: ",url)
-                                request_body = {"line_number" : res}
-                                request_body_json = json.dumps(request_body)
-                                try:
-                                        response = requests.post(url, data=request_body_json)
-                                        if response.status_code == 200:
-                                            print("Success: Last line deleted")
-                                        else:
-                                            print(f'An unexpected status code received: {response.status_code}')
-                                except requests.RequestException as e:
-                                    print(f'An exception occurred while sending the request to {addr}: {e}')
-                    
+                    rollback_replica_logs(raft_replica_address, failed_follower)
+                    # The order is not placed, give its toys back
+                    if reservations is not None:
+                        release_in_catalog(reservations)
+
                     self.send_response(503)
                     self.send_header("Content-type", "application/json")
                     self.end_headers()
@@ -351,15 +519,13 @@ class OrderRequestHandler(http.server.BaseHTTPRequestHandler):
                     # Append in leader node
                     self.server.raft_instance.append_log_entry(term, "ORDER REQUESTED", f"{toy_name},{quant}")
 
-                    #Forward request to catalog service to check
-                    base_url = f"http://{catalog_host}:{catalog_PORT}"
-                    url = f"{base_url}/orders/{toy_name}/{quant}"
-                    response = requests.post(url)
-                        
+                    #Order the held toy once a majority has the log entry
                     # Send the appropriate response based on the result of the order operation
-                    if response.status_code == 200:
+                    if status == 200:
+                        status = commit_in_catalog(reservations)
+                    if status == 200:
 
-                        with rwlock.w_locked():
+                        with self.server.rwlock.w_locked():
                             order_number += 1
                             current_order_number = order_number
                             update_csv(current_order_number, toy_name, quant)
@@ -397,7 +563,7 @@ class OrderRequestHandler(http.server.BaseHTTPRequestHandler):
                             self.wfile.write(response_json.encode())
 
                     else:
-                        self.send_response(400)
+                        self.send_response(status)
                         self.send_header("Content-type", "application/json")
                         self.end_headers()
 
@@ -430,6 +596,7 @@ class OrderRequestHandler(http.server.BaseHTTPRequestHandler):
             print(message)
             if message == "You win":
                 print('I am the leader now.')
+                is_leader = True
                 self.send_response(200)
                 self.end_headers()
                 self.wfile.write(json.dumps({'message': f'From Leader: Leader ID {leader_id} selected.'}).encode('utf-8'))
@@ -449,6 +616,7 @@ class OrderRequestHandler(http.server.BaseHTTPRequestHandler):
             leader_address = f"http://{leader_host}:{leader_port}"
 
             print(f'Order ID {leader_id} is the leader now.')
+            is_leader = False
             
             self.send_response(200)
             self.end_headers()
@@ -551,12 +719,11 @@ class OrderRequestHandler(http.server.BaseHTTPRequestHandler):
             content_length = int(self.headers['Content-Length'])
             request_body = self.rfile.read(content_length).decode()
             parsed_body = json.loads(request_body)
-            order_number = parsed_body.get("order_number")
-            name = parsed_body.get("name")
-            quantity = parsed_body.get("quantity")
 
-            #To update in the replicas 
-            update_csv(order_number, name, quantity)
+            #To update in the replicas, either a single order or all orders of a cart
+            for replicated in parsed_body.get("orders", [parsed_body]):
+                order_number = replicated.get("order_number")
+                update_csv(order_number, replicated.get("name"), replicated.get("quantity"))
             self.send_response(200)    
             self.send_header("Content-type", "application/json")
             self.end_headers()
@@ -571,8 +738,30 @@ class OrderRequestHandler(http.server.BaseHTTPRequestHandler):
         # If the request is for order lookup
         if self.path.startswith("/orders"):
 
-            # Parse the toy name from the request URL
-            order_no = self.path.split("/")[-1]
+            # Parse the order number from the request URL
+            url = urlparse(self.path)
+            order_no = url.path.split("/")[-1]
+
+            # A read sent to a follower carries the order number it needs (min_position). A follower that
+            # has not applied it yet waits briefly for replication, then sends the reader to the leader.
+            query_params = parse_qs(url.query)
+            if "min_position" in query_params and not is_leader:
+                try:
+                    min_position = int(query_params["min_position"][0])
+                except ValueError:
+                    self.send_response(400)
+                    self.send_header("Content-type", "application/json")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                with applied_cond:
+                    caught_up = applied_cond.wait_for(lambda: applied_position >= min_position, follower_read_wait)
+                if not caught_up and leader_address:
+                    self.send_response(307)
+                    self.send_header("Location", f"{leader_address}{self.path}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
 
             # Order number lookup
             res = order_lookup(order_no)
@@ -636,6 +825,7 @@ class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
 
         #Initialize in memory DB
         init_order(csv_file, order)
+        advance_position()
         self.follower_addresses = []
         self.raft_instance = Raft(log_file, self.follower_addresses)
         self.raft_instance.init_logfile()      
@@ -648,8 +838,9 @@ class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
 def main(port, csv_file):
     # Create a threaded HTTP server that listens on the specified port and handles requests with the OrderRequestHandler class
     httpd = ThreadedHTTPServer(("", port), OrderRequestHandler)
+    # Reserves stock in the catalog while log entries are replicated
     httpd.executer = ThreadPoolExecutor(
-        max_workers=multiprocessing.cpu_count()
+        max_workers=max(32, multiprocessing.cpu_count())
     )  
     
     #Read last generated order no. from CSV for data to be persistent
@@ -682,8 +873,18 @@ if __name__ == "__main__":
     print("log_file: ",log_file)
     current_server_address = f"http://{order_host}:{order_PORT}"
     order = {}
+    # Highest order number up to which this replica has every order
+    applied_position = 0
+    applied_cond = Condition()
+    # Set by the frontend through /leaderselection and /inform_replica
+    leader_address = None
+    is_leader = False
+    # Seconds a follower waits for an order to be replicated before it sends the reader to the leader
+    follower_read_wait = float(os.getenv("order_follower_read_wait", 0.2))
    
     catalog_host = os.getenv("catalog_host")
     catalog_PORT = os.getenv("catalog_PORT")
+    # Shard i of the catalog listens on catalog_PORT + i
+    catalog_shards = int(os.getenv("catalog_shards", 1))
     print("Catalog Host:", catalog_host, "Catalog Port", catalog_PORT, "order_PORT: ",order_PORT)
     main(int(order_PORT), csv_file)
\ No newline at end of file
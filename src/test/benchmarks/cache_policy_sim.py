@@ -0,0 +1,51 @@
+import os
+import random
+import importlib.util
+
+# Import the frontend service from the source tree
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+spec = importlib.util.spec_from_file_location("frontend_service", os.path.join(SRC_DIR, "Frontend-Service", "frontend-service.py"))
+frontend_service = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(frontend_service)
+
+
+# Toy names drawn from a Zipf distribution, a few toys get most of the lookups
+def zipf_trace(sku_count, exponent, count, seed):
+    weights = [1 / (rank + 1) ** exponent for rank in range(sku_count)]
+    return [f"Toy{i}" for i in random.Random(seed).choices(range(sku_count), weights=weights, k=count)]
+
+
+# Zipf lookups where every scan_every lookups a client walks through scan_length rare toys in a row
+def scan_trace(sku_count, exponent, count, scan_every, scan_length, seed):
+    trace = []
+    scan_start = sku_count // 2
+    for i, toy_name in enumerate(zipf_trace(sku_count, exponent, count, seed)):
+        trace.append(toy_name)
+        if i % scan_every == scan_every - 1:
+            trace.extend(f"Toy{scan_start + j}" for j in range(scan_length))
+            scan_start = (scan_start + scan_length) % sku_count
+    return trace
+
+
+# Replay a trace on a cache the way the frontend uses it, a miss is fetched and put into the cache
+def replay(cache, trace):
+    for toy_name in trace:
+        if cache.get(toy_name) == -1:
+            cache.put(toy_name, {"data": {"name": toy_name, "price": 9.99, "quantity": 100}})
+    return cache.stats()["hit_ratio"]
+
+
+if __name__ == "__main__":
+    sku_count = 10000
+    lookups = 200000
+    traces = {
+        "zipf 0.8": zipf_trace(sku_count, 0.8, lookups, seed=1),
+        "zipf 1.1": zipf_trace(sku_count, 1.1, lookups, seed=1),
+        "zipf 1.1 + scans": scan_trace(sku_count, 1.1, lookups, scan_every=1000, scan_length=500, seed=1),
+    }
+
+    for name, trace in traces.items():
+        for cache_size in [50, 100, 500, 1000]:
+            hit_ratios = {policy: replay(frontend_service.LRUCache(cache_size, segments=16, policy=policy), trace)
+                          for policy in ["lru", "tinylfu"]}
+            print(f"{name}, cache size {cache_size}: " + ", ".join(f"{policy} {hit_ratio:.3f}" for policy, hit_ratio in hit_ratios.items()))
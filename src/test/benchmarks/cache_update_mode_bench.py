@@ -0,0 +1,129 @@
+import os
+import sys
+import csv
+import time
+import random
+import socket
+import tempfile
+import threading
+import contextlib
+import http.client
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+
+# Import the catalog and the frontend service from the source tree
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+sys.path.insert(0, os.path.join(SRC_DIR, "Catalog"))
+from catalog import CatalogServer
+
+spec = importlib.util.spec_from_file_location("frontend_service", os.path.join(SRC_DIR, "Frontend-Service", "frontend-service.py"))
+frontend_service = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(frontend_service)
+
+
+# Frontend that counts the lookups it has to forward to the catalog
+class CountingFrontEndService(frontend_service.FrontEndService):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.misses = 0
+
+    def query_product(self, product_name):
+        self.misses += 1
+        return super().query_product(product_name)
+
+
+def write_catalog(csv_file, sku_count):
+    with open(csv_file, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Toy Name", "Quantity", "Price"])
+        for i in range(sku_count):
+            writer.writerow([f"Toy{i}", 100000000, 9.99])
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("", 0))
+        return sock.getsockname()[1]
+
+
+# Toy names drawn from a Zipf distribution, a few toys get most of the queries and orders
+def zipf_names(sku_count, exponent, count, seed):
+    weights = [1 / (rank + 1) ** exponent for rank in range(sku_count)]
+    return [f"Toy{i}" for i in random.Random(seed).choices(range(sku_count), weights=weights, k=count)]
+
+
+# Start a catalog and a frontend with a cache in the background, return the frontend and the addresses
+def start_services(directory, sku_count, cache_size, mode):
+    csv_file = os.path.join(directory, "catalog.csv")
+    write_catalog(csv_file, sku_count)
+    catalog_port, frontend_port = free_port(), free_port()
+
+    catalog = CatalogServer(catalog_port, csv_file, True, snapshot_interval=3600,
+                            frontend_address=f"http://localhost:{frontend_port}", cache_update_mode=mode)
+    thread = threading.Thread(target=catalog.start_server)
+    thread.daemon = True
+    thread.start()
+
+    frontend = CountingFrontEndService(frontend_port, f"http://localhost:{catalog_port}", [1, 2, 3], cache_size, True)
+    thread = threading.Thread(target=frontend.serve_forever)
+    thread.daemon = True
+    thread.start()
+    time.sleep(1)
+    return frontend, catalog_port, frontend_port
+
+
+# Query the frontend from several clients while toys are ordered in the catalog, return the hit ratio and latencies
+def run(frontend, catalog_port, frontend_port, sku_count, clients, queries_per_client, orders_per_sec):
+    stop = threading.Event()
+
+    def order():
+        connection = http.client.HTTPConnection("localhost", catalog_port)
+        for toy_name in zipf_names(sku_count, 1.1, 1000000, seed=1):
+            if stop.is_set():
+                break
+            connection.request("POST", f"/orders/{toy_name}/1")
+            connection.getresponse().read()
+            time.sleep(1 / orders_per_sec)
+        connection.close()
+
+    def client(client_id):
+        connection = http.client.HTTPConnection("localhost", frontend_port)
+        latencies = []
+        for toy_name in zipf_names(sku_count, 1.1, queries_per_client, seed=100 + client_id):
+            start = time.perf_counter()
+            connection.request("GET", f"/product/{toy_name}")
+            connection.getresponse().read()
+            latencies.append(time.perf_counter() - start)
+        connection.close()
+        return latencies
+
+    order_thread = threading.Thread(target=order)
+    order_thread.start()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        latencies = sorted(latency for result in executor.map(client, range(clients)) for latency in result)
+    stop.set()
+    order_thread.join()
+
+    queries = clients * queries_per_client
+    return 1 - frontend.misses / queries, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+if __name__ == "__main__":
+    sku_count = 1000
+    cache_size = 100
+    clients = 8
+    queries_per_client = 2000
+    orders_per_sec = 200
+
+    results = {}
+    for mode in ["invalidate", "update"]:
+        with tempfile.TemporaryDirectory() as directory:
+            # The services log every request, keep the output for the results
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+                frontend, catalog_port, frontend_port = start_services(directory, sku_count, cache_size, mode)
+                results[mode] = run(frontend, catalog_port, frontend_port, sku_count, clients, queries_per_client, orders_per_sec)
+            frontend.shutdown()
+            frontend.server_close()
+
+    for mode, (hit_ratio, p50, p99) in results.items():
+        print(f"{mode}: hit ratio {hit_ratio:.3f}, p50 {p50 * 1000:.2f} ms, p99 {p99 * 1000:.2f} ms")
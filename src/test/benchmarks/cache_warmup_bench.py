@@ -0,0 +1,139 @@
+import os
+import sys
+import csv
+import time
+import random
+import socket
+import tempfile
+import threading
+import contextlib
+import http.client
+import importlib.util
+
+# Import the catalog and the frontend service from the source tree
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+sys.path.insert(0, os.path.join(SRC_DIR, "Catalog"))
+from catalog import CatalogServer
+
+spec = importlib.util.spec_from_file_location("frontend_service", os.path.join(SRC_DIR, "Frontend-Service", "frontend-service.py"))
+frontend_service = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(frontend_service)
+
+
+# Frontend that counts the lookups it has to forward to the catalog
+class CountingFrontEndService(frontend_service.FrontEndService):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.misses = 0
+
+    def query_product(self, product_name):
+        self.misses += 1
+        return super().query_product(product_name)
+
+
+def write_catalog(csv_file, sku_count):
+    with open(csv_file, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Toy Name", "Quantity", "Price"])
+        for i in range(sku_count):
+            writer.writerow([f"Toy{i}", 100000000, 9.99])
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("", 0))
+        return sock.getsockname()[1]
+
+
+# Toy names drawn from a Zipf distribution, a few toys get most of the queries. The ranks are shuffled
+# so the hottest toys are not the first ones in name order.
+def zipf_names(sku_count, exponent, count, seed):
+    ranks = list(range(sku_count))
+    random.Random(0).shuffle(ranks)
+    weights = [1 / (rank + 1) ** exponent for rank in range(sku_count)]
+    return [f"Toy{ranks[i]}" for i in random.Random(seed).choices(range(sku_count), weights=weights, k=count)]
+
+
+def start_catalog(directory, sku_count):
+    csv_file = os.path.join(directory, "catalog.csv")
+    write_catalog(csv_file, sku_count)
+    catalog_port = free_port()
+    catalog = CatalogServer(catalog_port, csv_file, False, snapshot_interval=3600)
+    thread = threading.Thread(target=catalog.start_server)
+    thread.daemon = True
+    thread.start()
+    time.sleep(1)
+    return catalog_port
+
+
+def start_frontend(catalog_port, cache_size, snapshot_file):
+    frontend_port = free_port()
+    frontend = CountingFrontEndService(frontend_port, f"http://localhost:{catalog_port}", [1, 2, 3], cache_size, True,
+                                       cache_snapshot_file=snapshot_file, cache_snapshot_interval=3600)
+    return frontend, frontend_port
+
+
+def serve(frontend):
+    thread = threading.Thread(target=frontend.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+
+def stop(frontend):
+    frontend.shutdown()
+    frontend.server_close()
+
+
+# Query the frontend and return the hit ratio of every window of queries
+def run(frontend, frontend_port, toy_names, window):
+    connection = http.client.HTTPConnection("localhost", frontend_port)
+    hit_ratios = []
+    for start in range(0, len(toy_names), window):
+        misses = frontend.misses
+        for toy_name in toy_names[start:start + window]:
+            connection.request("GET", f"/product/{toy_name}")
+            connection.getresponse().read()
+        hit_ratios.append(1 - (frontend.misses - misses) / window)
+    connection.close()
+    return hit_ratios
+
+
+if __name__ == "__main__":
+    sku_count = 5000
+    cache_size = 500
+    window = 250
+    queries = 20000
+
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot_file = os.path.join(directory, "cache.json")
+        results = {}
+        # The services log every request, keep the output for the results
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+            catalog_port = start_catalog(directory, sku_count)
+
+            # Run a frontend until its cache is steady and write a cache snapshot when it stops
+            frontend, frontend_port = start_frontend(catalog_port, cache_size, snapshot_file)
+            serve(frontend)
+            hit_ratios = run(frontend, frontend_port, zipf_names(sku_count, 1.1, queries, seed=1), window)
+            steady = sum(hit_ratios[len(hit_ratios) // 2:]) / (len(hit_ratios) - len(hit_ratios) // 2)
+            frontend.save_cache_snapshot()
+            stop(frontend)
+
+            # Restart it cold, warmed up from the catalog in name order, and warmed up from the snapshot
+            for mode in ["cold", "catalog", "snapshot"]:
+                frontend, frontend_port = start_frontend(catalog_port, cache_size, snapshot_file if mode == "snapshot" else None)
+                start = time.perf_counter()
+                if mode != "cold":
+                    frontend.warm_up()
+                warm_up_time = time.perf_counter() - start
+                frontend.misses = 0
+                serve(frontend)
+                results[mode] = warm_up_time, run(frontend, frontend_port, zipf_names(sku_count, 1.1, queries, seed=2), window)
+                stop(frontend)
+
+    print(f"steady hit ratio before the restart: {steady:.3f}")
+    for mode, (warm_up_time, hit_ratios) in results.items():
+        # Queries until a window reaches 95% of the steady hit ratio
+        steady_window = next((i for i, hit_ratio in enumerate(hit_ratios) if hit_ratio >= 0.95 * steady), len(hit_ratios))
+        print(f"{mode}: warm-up {warm_up_time * 1000:.0f} ms, first {window} queries hit ratio {hit_ratios[0]:.3f}, "
+              f"steady after {steady_window * window} queries")
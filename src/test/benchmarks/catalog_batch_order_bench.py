@@ -0,0 +1,75 @@
+import os
+import sys
+import csv
+import time
+import socket
+import tempfile
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+
+# Import the catalog service from the source tree
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Catalog"))
+from catalog import CatalogServer
+
+
+def write_catalog(csv_file, sku_count):
+    with open(csv_file, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Toy Name", "Quantity", "Price"])
+        for i in range(sku_count):
+            writer.writerow([f"Toy{i}", 100000000, 9.99])
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("", 0))
+        return sock.getsockname()[1]
+
+
+# Start a catalog service in the background and return its address
+def start_catalog(directory, sku_count):
+    csv_file = os.path.join(directory, "catalog.csv")
+    write_catalog(csv_file, sku_count)
+    port = free_port()
+    server = CatalogServer(port, csv_file, False, snapshot_interval=3600)
+    thread = threading.Thread(target=server.start_server)
+    thread.daemon = True
+    thread.start()
+    time.sleep(1)
+    return f"http://localhost:{port}"
+
+
+def order_per_item(session, base_url, cart):
+    for item in cart:
+        session.post(f"{base_url}/orders/{item['name']}/{item['quantity']}")
+
+
+def order_batch(session, base_url, cart):
+    session.post(f"{base_url}/orders/batch", json={"items": cart})
+
+
+# Order carts from several client threads and return the carts per second
+def run(base_url, order_cart, cart_size, carts_per_client, clients):
+    def client(client_id):
+        session = requests.Session()
+        for i in range(carts_per_client):
+            cart = [{"name": f"Toy{(client_id * 31 + i * cart_size + j) % 1000}", "quantity": 1} for j in range(cart_size)]
+            order_cart(session, base_url, cart)
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(client, range(clients)))
+    return clients * carts_per_client / (time.time() - start)
+
+
+if __name__ == "__main__":
+    clients = 8
+    carts_per_client = 50
+
+    with tempfile.TemporaryDirectory() as directory:
+        base_url = start_catalog(directory, 1000)
+        for cart_size in [1, 5, 20]:
+            per_item = run(base_url, order_per_item, cart_size, carts_per_client, clients)
+            batch = run(base_url, order_batch, cart_size, carts_per_client, clients)
+            print(f"Cart with {cart_size} toys: per-item {per_item:.1f} carts/sec, batch {batch:.1f} carts/sec")
@@ -0,0 +1,61 @@
+import os
+import sys
+import csv
+import time
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+# Import the catalog service from the source tree
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Catalog"))
+from catalog import CatalogServer
+
+
+def write_catalog(csv_file, sku_count):
+    with open(csv_file, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Toy Name", "Quantity", "Price"])
+        for i in range(sku_count):
+            writer.writerow([f"Toy{i}", 100000000, 9.99])
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+# Run the given number of concurrent buyers and return the p50/p99 latency in ms and the orders per second
+def run(concurrency, orders_per_buyer, group_commit, window, batch_size):
+    with tempfile.TemporaryDirectory() as directory:
+        csv_file = os.path.join(directory, "catalog.csv")
+        write_catalog(csv_file, 100)
+        server = CatalogServer(0, csv_file, False, snapshot_interval=3600, group_commit=group_commit,
+                               group_commit_window=window, group_commit_batch_size=batch_size)
+        server.init_catalog()
+
+        def buyer(buyer_id):
+            latencies = []
+            for i in range(orders_per_buyer):
+                start = time.time()
+                server.order(f"Toy{(buyer_id + i) % 100}", 1)
+                latencies.append(time.time() - start)
+            return latencies
+
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(buyer, range(concurrency)))
+        elapsed = time.time() - start
+
+        latencies = [latency * 1000 for result in results for latency in result]
+        return percentile(latencies, 50), percentile(latencies, 99), len(latencies) / elapsed
+
+
+if __name__ == "__main__":
+    orders_per_buyer = 200
+
+    for concurrency in [1, 8, 32, 128]:
+        print(f"Concurrent buyers: {concurrency}")
+        # Without group commit every order is flushed to the OS on its own but never fsynced.
+        # A window of 0 commits whatever queued up while the previous fsync was running.
+        for label, group_commit, window, batch_size in [("flush per order", False, 0, 1), ("group commit 0ms/64", True, 0, 64), ("group commit 2ms/64", True, 0.002, 64)]:
+            p50, p99, throughput = run(concurrency, orders_per_buyer, group_commit, window, batch_size)
+            print(f"  {label:20} p50 {p50:.2f} ms  p99 {p99:.2f} ms  {throughput:.1f} orders/sec")
@@ -0,0 +1,76 @@
+import os
+import sys
+import csv
+import time
+import socket
+import tempfile
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+
+# Import the catalog service from the source tree
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Catalog"))
+from catalog import CatalogServer
+
+
+# Catalog that encodes the lookup response again on every request, as before the responses were kept
+class EncodeEveryTimeCatalogServer(CatalogServer):
+    def lookup_response(self, toy_name, if_none_match=None):
+        with self.locks.locked(toy_name):
+            if toy_name not in self.catalog:
+                return None
+            return self.encode_response(toy_name)
+
+
+def write_catalog(csv_file, sku_count):
+    with open(csv_file, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Toy Name", "Quantity", "Price"])
+        for i in range(sku_count):
+            writer.writerow([f"Toy{i}", 1000, 9.99])
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("", 0))
+        return sock.getsockname()[1]
+
+
+# Start a catalog service in the background and return its address
+def start_catalog(server_class, directory, sku_count):
+    csv_file = os.path.join(directory, "catalog.csv")
+    write_catalog(csv_file, sku_count)
+    port = free_port()
+    server = server_class(port, csv_file, False, snapshot_interval=3600)
+    thread = threading.Thread(target=server.start_server)
+    thread.daemon = True
+    thread.start()
+    time.sleep(1)
+    return f"http://localhost:{port}"
+
+
+# Look up toys from several client threads over kept-alive connections and return the lookups per second
+def run(base_url, sku_count, lookups_per_client, clients):
+    def client(client_id):
+        session = requests.Session()
+        for i in range(lookups_per_client):
+            session.get(f"{base_url}/product/Toy{(client_id * 31 + i) % sku_count}")
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(client, range(clients)))
+    return clients * lookups_per_client / (time.time() - start)
+
+
+if __name__ == "__main__":
+    sku_count = 100
+    lookups_per_client = 2000
+
+    for clients in [1, 8]:
+        with tempfile.TemporaryDirectory() as directory:
+            base_url = start_catalog(EncodeEveryTimeCatalogServer, directory, sku_count)
+            encoded = run(base_url, sku_count, lookups_per_client, clients)
+        with tempfile.TemporaryDirectory() as directory:
+            base_url = start_catalog(CatalogServer, directory, sku_count)
+            kept = run(base_url, sku_count, lookups_per_client, clients)
+        print(f"{clients} clients: encode every lookup {encoded:.0f} lookups/sec, kept responses {kept:.0f} lookups/sec")
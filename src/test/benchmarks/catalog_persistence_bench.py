@@ -0,0 +1,68 @@
+import os
+import sys
+import csv
+import time
+import tempfile
+import pandas as pd
+
+# Import the catalog service from the source tree
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Catalog"))
+from catalog import CatalogServer
+
+
+# Catalog server that persists every order by rewriting the CSV file with pandas (the previous behaviour)
+class CsvRewriteCatalogServer(CatalogServer):
+
+    def update(self, toy):
+        self.changed(toy)
+        df = pd.read_csv(self.csv_file)
+        for name in self.catalog.names():
+            if name in df['Toy Name'].values:
+                df.loc[df['Toy Name'] == name, 'Quantity'] = self.catalog.quantity(name)
+                df.loc[df['Toy Name'] == name, 'Price'] = self.catalog.price(name)
+        df.to_csv(self.csv_file, index=False)
+        # The CSV file is already written, there is nothing to wait for
+        return 0
+
+
+def write_catalog(csv_file, sku_count):
+    with open(csv_file, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Toy Name", "Quantity", "Price"])
+        for i in range(sku_count):
+            writer.writerow([f"Toy{i}", 1000000, 9.99])
+
+
+# Place orders for random toys until the time budget is spent and return the orders per second
+def run(server_class, sku_count, max_orders, time_budget):
+    with tempfile.TemporaryDirectory() as directory:
+        csv_file = os.path.join(directory, "catalog.csv")
+        write_catalog(csv_file, sku_count)
+        server = server_class(0, csv_file, False, snapshot_interval=3600)
+        server.init_catalog()
+
+        orders = 0
+        start = time.time()
+        while orders < max_orders and time.time() - start < time_budget:
+            server.order(f"Toy{orders % sku_count}", 1)
+            orders += 1
+        elapsed = time.time() - start
+
+        # Time one snapshot as well, it runs in the background in the journaled server
+        snapshot_start = time.time()
+        server.snapshot()
+        snapshot_time = time.time() - snapshot_start
+        server.journal.file.close()
+        return orders / elapsed, snapshot_time
+
+
+if __name__ == "__main__":
+    max_orders = 10000
+    time_budget = 10
+
+    for sku_count in [10, 10000, 1000000]:
+        before, _ = run(CsvRewriteCatalogServer, sku_count, max_orders, time_budget)
+        after, snapshot_time = run(CatalogServer, sku_count, max_orders, time_budget)
+        print(f"SKUs: {sku_count}")
+        print(f"  CSV rewrite per order: {before:.1f} orders/sec")
+        print(f"  Journal + snapshots:   {after:.1f} orders/sec (one snapshot takes {snapshot_time:.3f} sec)")
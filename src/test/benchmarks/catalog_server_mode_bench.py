@@ -0,0 +1,112 @@
+import os
+import sys
+import csv
+import time
+import socket
+import resource
+import tempfile
+import subprocess
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+
+# Import the catalog service from the source tree
+CATALOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Catalog")
+sys.path.insert(0, CATALOG_DIR)
+
+
+def write_catalog(csv_file, sku_count):
+    with open(csv_file, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Toy Name", "Quantity", "Price"])
+        for i in range(sku_count):
+            writer.writerow([f"Toy{i}", 100000000, 9.99])
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("", 0))
+        return sock.getsockname()[1]
+
+
+def rss_bytes(pid):
+    with open(f"/proc/{pid}/statm") as file:
+        return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+# Allow as many open sockets as the system permits
+def raise_open_files_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+# Run a catalog service in its own process so its memory can be measured
+def start_catalog(mode, csv_file):
+    port = free_port()
+    process = subprocess.Popen([sys.executable, __file__, "--serve", mode, str(port), csv_file], stdout=subprocess.DEVNULL)
+    time.sleep(2)
+    return process, port
+
+
+# Open keep-alive connections that each make one lookup and then stay idle, return how many got an answer
+def hold_connections(port, count):
+    connections = []
+    for i in range(count):
+        try:
+            connection = http.client.HTTPConnection("localhost", port, timeout=10)
+            connection.request("GET", f"/product/Toy{i % 100}")
+            connection.getresponse().read()
+            connections.append(connection)
+        except OSError:
+            break
+    return connections
+
+
+# Look up toys from several client threads over kept-alive connections and return the requests per second
+def run(port, requests_per_client, clients):
+    def client(client_id):
+        connection = http.client.HTTPConnection("localhost", port, timeout=10)
+        for i in range(requests_per_client):
+            if i % 10 == 0:
+                connection.request("POST", f"/orders/Toy{(client_id + i) % 100}/1")
+            else:
+                connection.request("GET", f"/product/Toy{(client_id * 31 + i) % 100}")
+            connection.getresponse().read()
+        connection.close()
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(client, range(clients)))
+    return clients * requests_per_client / (time.time() - start)
+
+
+if __name__ == "__main__":
+    raise_open_files_limit()
+
+    if len(sys.argv) == 5 and sys.argv[1] == "--serve":
+        from catalog import CatalogServer
+        CatalogServer(sys.argv[3], sys.argv[4], False, snapshot_interval=3600, server_mode=sys.argv[2]).start_server()
+        sys.exit(0)
+
+    idle_connections = 2000
+    for mode in ["threaded", "asyncio"]:
+        with tempfile.TemporaryDirectory() as directory:
+            csv_file = os.path.join(directory, "catalog.csv")
+            write_catalog(csv_file, 100)
+            process, port = start_catalog(mode, csv_file)
+            try:
+                rss_before = rss_bytes(process.pid)
+                connections = hold_connections(port, idle_connections)
+                rss_held = rss_bytes(process.pid)
+                # Measure the request rate while the idle connections are still open
+                rates = {clients: run(port, 2000, clients) for clients in [1, 8, 64]}
+                for connection in connections:
+                    connection.close()
+            finally:
+                process.kill()
+                process.wait()
+
+        print(f"{mode}: held {len(connections)}/{idle_connections} idle connections, "
+              f"RSS {rss_before / 2**20:.1f} MiB -> {rss_held / 2**20:.1f} MiB "
+              f"({(rss_held - rss_before) / max(len(connections), 1) / 1024:.1f} KiB/connection)")
+        for clients, rate in rates.items():
+            print(f"  {clients} clients: {rate:.0f} requests/sec")
@@ -0,0 +1,95 @@
+import os
+import sys
+import csv
+import time
+import socket
+import zlib
+import tempfile
+import http.client
+import multiprocessing
+
+# Import the catalog service from the source tree
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Catalog"))
+from catalog import shard_csv_files, run_shard
+
+
+def write_catalog(csv_file, sku_count):
+    with open(csv_file, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Toy Name", "Quantity", "Price"])
+        for i in range(sku_count):
+            writer.writerow([f"Toy{i}", 100000000, 9.99])
+
+
+def free_port_range(count):
+    while True:
+        with socket.socket() as sock:
+            sock.bind(("", 0))
+            base = sock.getsockname()[1]
+        if base + count < 65536 and all(port_is_free(base + i) for i in range(count)):
+            return base
+
+
+def port_is_free(port):
+    with socket.socket() as sock:
+        try:
+            sock.bind(("", port))
+            return True
+        except OSError:
+            return False
+
+
+# Start one catalog process per shard, shard i listens on base_port + i
+def start_shards(directory, sku_count, shards):
+    csv_file = os.path.join(directory, "catalog.csv")
+    write_catalog(csv_file, sku_count)
+    base_port = free_port_range(shards)
+    processes = []
+    for shard, shard_file in enumerate(shard_csv_files(csv_file, shards)):
+        process = multiprocessing.Process(target=run_shard, args=(base_port + shard, shard_file, False, {"snapshot_interval": 3600}))
+        process.start()
+        processes.append(process)
+    time.sleep(2)
+    return base_port, processes
+
+
+# One client process: lookups and orders sent straight to the shard that owns the toy, one order per ten requests
+def client(base_port, shards, sku_count, client_id, requests_per_client):
+    connections = [http.client.HTTPConnection("localhost", base_port + shard, timeout=30) for shard in range(shards)]
+    for i in range(requests_per_client):
+        toy_name = f"Toy{(client_id * 7919 + i * 31) % sku_count}"
+        connection = connections[zlib.crc32(toy_name.encode()) % shards]
+        if i % 10 == 0:
+            connection.request("POST", f"/orders/{toy_name}/1")
+        else:
+            connection.request("GET", f"/product/{toy_name}")
+        connection.getresponse().read()
+
+
+# Return the requests per second of all client processes together
+def run(base_port, shards, sku_count, clients, requests_per_client):
+    processes = [multiprocessing.Process(target=client, args=(base_port, shards, sku_count, client_id, requests_per_client))
+                 for client_id in range(clients)]
+    start = time.time()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    return clients * requests_per_client / (time.time() - start)
+
+
+if __name__ == "__main__":
+    sku_count = 10000
+    clients = 2 * multiprocessing.cpu_count()
+    requests_per_client = 5000
+
+    for shards in [1, 2, 4, 8]:
+        with tempfile.TemporaryDirectory() as directory:
+            base_port, processes = start_shards(directory, sku_count, shards)
+            try:
+                rate = run(base_port, shards, sku_count, clients, requests_per_client)
+            finally:
+                for process in processes:
+                    process.kill()
+                    process.join()
+        print(f"{shards} shards: {rate:.0f} requests/sec ({clients} client processes, {multiprocessing.cpu_count()} cores)")
@@ -0,0 +1,71 @@
+import os
+import sys
+import csv
+import json
+import time
+import subprocess
+import tempfile
+
+# Import the catalog service from the source tree
+CATALOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Catalog")
+sys.path.insert(0, CATALOG_DIR)
+
+
+def write_catalog(csv_file, sku_count):
+    with open(csv_file, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Toy Name", "Quantity", "Price"])
+        for i in range(sku_count):
+            writer.writerow([f"Toy{i}", 1000, 9.99])
+
+
+def rss_bytes():
+    with open("/proc/self/statm") as file:
+        return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+# Load the catalog in this process and print the startup time, the memory it added and the lookup rate
+def measure(store, csv_file):
+    from catalog import CatalogServer
+
+    rss_before = rss_bytes()
+    start = time.time()
+    server = CatalogServer(0, csv_file, False, snapshot_interval=3600, store=store)
+    server.init_catalog()
+    startup = time.time() - start
+    rss_after = rss_bytes()
+
+    sku_count = len(server.catalog)
+    lookups = 100000
+    start = time.time()
+    for i in range(lookups):
+        server.lookup(f"Toy{(i * 7919) % sku_count}")
+    lookup_rate = lookups / (time.time() - start)
+
+    print(json.dumps({"startup": startup, "bytes_per_sku": (rss_after - rss_before) / sku_count, "lookups_per_sec": lookup_rate}))
+
+
+def run(store, csv_file):
+    output = subprocess.check_output([sys.executable, __file__, "--measure", store, csv_file])
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--measure":
+        measure(sys.argv[2], sys.argv[3])
+        sys.exit(0)
+
+    for sku_count in [1000000, 10000000]:
+        with tempfile.TemporaryDirectory() as directory:
+            csv_file = os.path.join(directory, "catalog.csv")
+            write_catalog(csv_file, sku_count)
+
+            print(f"SKUs: {sku_count}")
+            result = run("dict", csv_file)
+            print(f"  dict of dicts:       startup {result['startup']:.2f} sec, {result['bytes_per_sku']:.0f} bytes/SKU, {result['lookups_per_sec']:.0f} lookups/sec")
+            # The first start builds the map file from the CSV file, later starts only map it
+            result = run("mmap", csv_file)
+            print(f"  mmap (first build):  startup {result['startup']:.2f} sec")
+            result = run("mmap", csv_file)
+            print(f"  mmap arrays:         startup {result['startup']:.2f} sec, {result['bytes_per_sku']:.0f} bytes/SKU, {result['lookups_per_sec']:.0f} lookups/sec")
+            print(f"  mmap file size:      {os.path.getsize(os.path.join(directory, 'catalog.mmap')) / sku_count:.0f} bytes/SKU")
@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import socket
+import threading
+import contextlib
+import importlib.util
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Import the frontend service from the source tree
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+spec = importlib.util.spec_from_file_location("frontend_service", os.path.join(SRC_DIR, "Frontend-Service", "frontend-service.py"))
+frontend_service = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(frontend_service)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("", 0))
+        return sock.getsockname()[1]
+
+
+# Order replica that answers health checks, leader announcements and orders without a catalog behind it.
+# A hung replica still accepts connections but never answers.
+class ReplicaHandler(BaseHTTPRequestHandler):
+    def reply(self, body):
+        if self.server.hung.is_set():
+            time.sleep(3600)
+        body = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.reply({"message": "Order service is responsive"})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.reply({"data": {"order_number": 0, "replica": self.server.order_id}})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ReplicaServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Every order opens a new connection, a short listen queue would drop connection attempts
+    request_queue_size = 128
+
+
+def start_replica(order_id, port):
+    server = ReplicaServer(("", port), ReplicaHandler)
+    server.order_id = order_id
+    server.hung = threading.Event()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+# Place orders from several clients, kill the leader (its port is closed, or it hangs) and
+# return the seconds until the first order on the new leader, the slowest order and the failed orders
+def run(health_check_interval, kill, clients, duration, kill_at):
+    ports = {order_id: free_port() for order_id in [1, 2, 3]}
+    replicas = {order_id: start_replica(order_id, port) for order_id, port in ports.items()}
+    frontend = frontend_service.FrontEndService(free_port(), "http://localhost:1", [1, 2, 3], 0, False,
+                                                order_addresses={order_id: f"http://localhost:{port}" for order_id, port in ports.items()},
+                                                read_timeout=1, health_check_interval=health_check_interval)
+    frontend.start_health_monitor()
+    time.sleep(0.5)
+
+    results = []
+    results_lock = threading.Lock()
+    stop = threading.Event()
+
+    def client():
+        while not stop.is_set():
+            start = time.perf_counter()
+            response = frontend.place_order(frontend, {"name": "Tux", "quantity": 1})
+            end = time.perf_counter()
+            with results_lock:
+                results.append((end, end - start, response.get("data", {}).get("replica")))
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    time.sleep(kill_at)
+    killed_at = time.perf_counter()
+    if kill == "closed":
+        replicas[3].shutdown()
+        replicas[3].server_close()
+    else:
+        replicas[3].hung.set()
+    time.sleep(duration - kill_at)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    frontend.server_close()
+    for order_id in [1, 2]:
+        replicas[order_id].shutdown()
+        replicas[order_id].server_close()
+
+    failover = min(end for end, _, replica in results if replica == 2) - killed_at
+    slowest = max(latency for _, latency, _ in results)
+    failed = sum(1 for _, _, replica in results if replica is None)
+    return failover, slowest, failed
+
+
+if __name__ == "__main__":
+    clients = 8
+    duration = 4
+    kill_at = 1
+
+    for kill in ["closed", "hung"]:
+        for health_check_interval in [0.5, 2]:
+            # The services log every request, keep the output for the results
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+                failover, slowest, failed = run(health_check_interval, kill, clients, duration, kill_at)
+            print(f"leader {kill}, health check every {health_check_interval} s: failover {failover * 1000:.0f} ms, "
+                  f"slowest order {slowest * 1000:.0f} ms, {failed} failed orders")
@@ -0,0 +1,40 @@
+import os
+import time
+import random
+import threading
+import importlib.util
+
+# Import the frontend service from the source tree
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+spec = importlib.util.spec_from_file_location("frontend_service", os.path.join(SRC_DIR, "Frontend-Service", "frontend-service.py"))
+frontend_service = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(frontend_service)
+
+
+# Run gets and puts (one put per ten operations) from several threads on one cache, return the operations per second
+def run(cache, key_count, threads, ops_per_thread):
+    def worker(worker_id):
+        rng = random.Random(worker_id)
+        keys = [f"Toy{rng.randrange(key_count)}" for _ in range(ops_per_thread)]
+        for i, key in enumerate(keys):
+            if i % 10 == 0 or cache.get(key) == -1:
+                cache.put(key, {"data": {"name": key, "price": 9.99, "quantity": 100}}, i)
+
+    workers = [threading.Thread(target=worker, args=(worker_id,)) for worker_id in range(threads)]
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return threads * ops_per_thread / (time.time() - start)
+
+
+if __name__ == "__main__":
+    key_count = 10000
+    capacity = 1000
+    ops_per_thread = 200000
+
+    for threads in [1, 2, 4, 8, 16]:
+        single = run(frontend_service.LRUCache(capacity, segments=1), key_count, threads, ops_per_thread)
+        segmented = run(frontend_service.LRUCache(capacity, segments=16), key_count, threads, ops_per_thread)
+        print(f"{threads} threads: 1 segment {single:.0f} ops/sec, 16 segments {segmented:.0f} ops/sec")
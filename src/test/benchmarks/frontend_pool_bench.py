@@ -0,0 +1,102 @@
+import os
+import sys
+import csv
+import time
+import socket
+import tempfile
+import threading
+import contextlib
+import http.client
+import importlib.util
+import requests
+from concurrent.futures import ThreadPoolExecutor
+
+# Import the catalog and the frontend service from the source tree
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+sys.path.insert(0, os.path.join(SRC_DIR, "Catalog"))
+from catalog import CatalogServer
+
+spec = importlib.util.spec_from_file_location("frontend_service", os.path.join(SRC_DIR, "Frontend-Service", "frontend-service.py"))
+frontend_service = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(frontend_service)
+
+
+# Calls the backends with bare requests.get/requests.post, a new connection per request as before the pool
+class BareRequests(object):
+    def get(self, url, **kwargs):
+        return requests.get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return requests.post(url, **kwargs)
+
+
+def write_catalog(csv_file, sku_count):
+    with open(csv_file, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Toy Name", "Quantity", "Price"])
+        for i in range(sku_count):
+            writer.writerow([f"Toy{i}", 1000, 9.99])
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("", 0))
+        return sock.getsockname()[1]
+
+
+# Start a catalog and a frontend without a cache in the background, so every query goes to the catalog
+def start_services(directory, pooled):
+    csv_file = os.path.join(directory, "catalog.csv")
+    write_catalog(csv_file, 100)
+    catalog_port, frontend_port = free_port(), free_port()
+
+    catalog = CatalogServer(catalog_port, csv_file, False, snapshot_interval=3600)
+    thread = threading.Thread(target=catalog.start_server)
+    thread.daemon = True
+    thread.start()
+
+    frontend = frontend_service.FrontEndService(frontend_port, f"http://localhost:{catalog_port}", [1, 2, 3], 10, False)
+    if not pooled:
+        frontend.session = BareRequests()
+    thread = threading.Thread(target=frontend.serve_forever)
+    thread.daemon = True
+    thread.start()
+    time.sleep(1)
+    return frontend, frontend_port
+
+
+# Query the frontend from several clients over kept-alive connections, return the sorted latencies and the queries per second
+def run(frontend_port, clients, queries_per_client):
+    def client(client_id):
+        connection = http.client.HTTPConnection("localhost", frontend_port)
+        latencies = []
+        for i in range(queries_per_client):
+            start = time.perf_counter()
+            connection.request("GET", f"/product/Toy{(client_id * 31 + i) % 100}")
+            connection.getresponse().read()
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        latencies = sorted(latency for result in executor.map(client, range(clients)) for latency in result)
+    return latencies, clients * queries_per_client / (time.time() - start)
+
+
+if __name__ == "__main__":
+    queries_per_client = 1000
+
+    for clients in [1, 8, 32]:
+        results = {}
+        for pooled in [False, True]:
+            with tempfile.TemporaryDirectory() as directory:
+                # The services log every request, keep the output for the results
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+                    frontend, frontend_port = start_services(directory, pooled)
+                    results[pooled] = run(frontend_port, clients, queries_per_client)
+                frontend.shutdown()
+
+        for pooled, (latencies, rate) in results.items():
+            name = "pooled session" if pooled else "bare requests"
+            print(f"{clients} clients, {name}: p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+                  f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms, {rate:.0f} queries/sec")
@@ -0,0 +1,118 @@
+import os
+import json
+import time
+import socket
+import threading
+import contextlib
+import importlib.util
+from urllib.parse import urlparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Import the frontend service from the source tree
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+spec = importlib.util.spec_from_file_location("frontend_service", os.path.join(SRC_DIR, "Frontend-Service", "frontend-service.py"))
+frontend_service = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(frontend_service)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("", 0))
+        return sock.getsockname()[1]
+
+
+# Order replica without a catalog behind it. All replicas share the orders, as if replication were instant,
+# and every replica counts the order lookups it serves.
+class ReplicaHandler(BaseHTTPRequestHandler):
+    def reply(self, status, body):
+        body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith("/orders"):
+            self.server.lookups += 1
+            order_no = urlparse(self.path).path.split("/")[-1]
+            placed = self.server.orders.get(int(order_no))
+            if placed is None:
+                self.reply(400, {})
+            else:
+                self.reply(200, {"data": {"Order number": order_no, "Toy name": placed[0], "Quantity": placed[1]}})
+        else:
+            self.reply(200, {"message": "Order service is responsive"})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+        if self.path == "/orders":
+            fields = dict(field.split("=") for field in body.split("&"))
+            with self.server.orders_lock:
+                order_number = len(self.server.orders) + 1
+                self.server.orders[order_number] = (fields["name"], float(fields["quantity"]))
+            self.reply(200, {"data": {"order_number": order_number}})
+        else:
+            self.reply(200, {})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ReplicaServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def start_replicas(orders, orders_lock):
+    replicas = {}
+    for order_id in [1, 2, 3]:
+        server = ReplicaServer(("", free_port()), ReplicaHandler)
+        server.orders, server.orders_lock, server.lookups = orders, orders_lock, 0
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        replicas[order_id] = server
+    return replicas
+
+
+# Place orders through the frontend, then read every one of them back like the client's verification pass.
+# Returns the order lookups served by the leader and by all replicas and the time of the verification pass.
+def run(sessions, orders_per_session, follower_reads, order_cache_size):
+    orders, orders_lock = {}, threading.Lock()
+    replicas = start_replicas(orders, orders_lock)
+    frontend = frontend_service.FrontEndService(free_port(), "http://localhost:1", [1, 2, 3], 0, False,
+                                                order_addresses={order_id: f"http://localhost:{replica.server_address[1]}" for order_id, replica in replicas.items()},
+                                                follower_reads=follower_reads, order_cache_size=order_cache_size)
+    frontend.start_health_monitor()
+    time.sleep(0.5)
+
+    placed = [frontend.place_order(frontend, {"name": "Tux", "quantity": 1})["data"]["order_number"]
+              for _ in range(sessions * orders_per_session)]
+    for replica in replicas.values():
+        replica.lookups = 0
+
+    start = time.perf_counter()
+    for order_number in placed:
+        assert "data" in frontend.query_order_number(frontend, str(order_number))
+    verify_time = time.perf_counter() - start
+
+    leader_lookups = replicas[frontend.leader_id].lookups
+    lookups = sum(replica.lookups for replica in replicas.values())
+    frontend.server_close()
+    for replica in replicas.values():
+        replica.shutdown()
+        replica.server_close()
+    return leader_lookups, lookups, verify_time
+
+
+if __name__ == "__main__":
+    sessions = 20
+    orders_per_session = 50
+
+    for name, follower_reads, order_cache_size in [("leader reads", False, 0), ("follower reads", True, 0), ("order cache", True, 10000)]:
+        # The services log every request, keep the output for the results
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+            leader_lookups, lookups, verify_time = run(sessions, orders_per_session, follower_reads, order_cache_size)
+        print(f"{name}: {leader_lookups} lookups on the leader, {lookups} on all replicas, "
+              f"verification of {sessions * orders_per_session} orders in {verify_time * 1000:.0f} ms")
@@ -0,0 +1,127 @@
+import os
+import sys
+import csv
+import time
+import socket
+import tempfile
+import threading
+import contextlib
+import http.client
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+
+# Import the catalog and the frontend service from the source tree
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+sys.path.insert(0, os.path.join(SRC_DIR, "Catalog"))
+from catalog import CatalogServer
+
+spec = importlib.util.spec_from_file_location("frontend_service", os.path.join(SRC_DIR, "Frontend-Service", "frontend-service.py"))
+frontend_service = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(frontend_service)
+
+
+# Catalog that counts the toy lookups it serves
+class CountingCatalogServer(CatalogServer):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lookups = 0
+
+    def lookup_response(self, toy_name, if_none_match=None):
+        self.lookups += 1
+        return super().lookup_response(toy_name, if_none_match)
+
+
+# Frontend where every miss goes to the catalog on its own
+class UncoalescedFrontEndService(frontend_service.FrontEndService):
+    def query_product(self, product_name):
+        return self.fetch_product(product_name)
+
+
+def write_catalog(csv_file):
+    with open(csv_file, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Toy Name", "Quantity", "Price"])
+        writer.writerow(["Tux", 100000000, 9.99])
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("", 0))
+        return sock.getsockname()[1]
+
+
+# Start a catalog and a frontend with a cache in the background
+def start_services(directory, frontend_class):
+    csv_file = os.path.join(directory, "catalog.csv")
+    write_catalog(csv_file)
+    catalog_port, frontend_port = free_port(), free_port()
+
+    catalog = CountingCatalogServer(catalog_port, csv_file, True, snapshot_interval=3600,
+                                    frontend_address=f"http://localhost:{frontend_port}")
+    thread = threading.Thread(target=catalog.start_server)
+    thread.daemon = True
+    thread.start()
+
+    frontend = frontend_class(frontend_port, f"http://localhost:{catalog_port}", [1, 2, 3], 100, True)
+    thread = threading.Thread(target=frontend.serve_forever)
+    thread.daemon = True
+    thread.start()
+    time.sleep(1)
+    return catalog, frontend, catalog_port, frontend_port
+
+
+# Query one toy from many clients while it is ordered (and so invalidated) in the catalog,
+# return the catalog lookups per second and per invalidation and the p99 query latency
+def run(catalog, catalog_port, frontend_port, clients, duration, invalidations_per_sec):
+    stop = threading.Event()
+    invalidations = [0]
+
+    def invalidate():
+        connection = http.client.HTTPConnection("localhost", catalog_port)
+        while not stop.is_set():
+            connection.request("POST", "/orders/Tux/1")
+            connection.getresponse().read()
+            invalidations[0] += 1
+            time.sleep(1 / invalidations_per_sec)
+
+    def client(client_id):
+        connection = http.client.HTTPConnection("localhost", frontend_port)
+        latencies = []
+        while not stop.is_set():
+            start = time.perf_counter()
+            connection.request("GET", "/product/Tux")
+            connection.getresponse().read()
+            latencies.append(time.perf_counter() - start)
+        connection.close()
+        return latencies
+
+    catalog.lookups = 0
+    invalidate_thread = threading.Thread(target=invalidate)
+    invalidate_thread.start()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        futures = [executor.submit(client, client_id) for client_id in range(clients)]
+        time.sleep(duration)
+        stop.set()
+        latencies = sorted(latency for future in futures for latency in future.result())
+    invalidate_thread.join()
+
+    return catalog.lookups / duration, catalog.lookups / max(invalidations[0], 1), latencies[int(len(latencies) * 0.99)]
+
+
+if __name__ == "__main__":
+    clients = 64
+    duration = 10
+    invalidations_per_sec = 20
+
+    results = {}
+    for name, frontend_class in [("uncoalesced", UncoalescedFrontEndService), ("coalesced", frontend_service.FrontEndService)]:
+        with tempfile.TemporaryDirectory() as directory:
+            # The services log every request, keep the output for the results
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+                catalog, frontend, catalog_port, frontend_port = start_services(directory, frontend_class)
+                results[name] = run(catalog, catalog_port, frontend_port, clients, duration, invalidations_per_sec)
+            frontend.shutdown()
+            frontend.server_close()
+
+    for name, (qps, per_invalidation, p99) in results.items():
+        print(f"{name}: {qps:.1f} catalog lookups/sec, {per_invalidation:.2f} per invalidation, p99 {p99 * 1000:.2f} ms")
@@ -0,0 +1,98 @@
+import os
+import threading
+import importlib.util
+import unittest
+
+# Import the frontend service from the source tree, its file name is not a module name
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+spec = importlib.util.spec_from_file_location("frontend_service", os.path.join(SRC_DIR, "Frontend-Service", "frontend-service.py"))
+frontend_service = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(frontend_service)
+LRUCache = frontend_service.LRUCache
+
+
+# Versions of the cached toys: late responses, updates and invalidations that arrive out of order
+class CacheVersionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = LRUCache(8)
+
+    def test_older_put_does_not_replace_a_newer_item(self):
+        self.cache.put("Tux", "v5", 5)
+        self.cache.put("Tux", "v3", 3)
+        self.assertEqual(self.cache.get("Tux"), "v5")
+        self.assertEqual(self.cache.version_of("Tux"), 5)
+
+        self.cache.put("Tux", "v6", 6)
+        self.assertEqual(self.cache.get("Tux"), "v6")
+        # Without a version the item is always replaced
+        self.cache.put("Tux", "none")
+        self.assertEqual(self.cache.get("Tux"), "none")
+
+    def test_older_invalidation_does_not_mark_a_newer_item_stale(self):
+        self.cache.put("Tux", "v5", 5)
+        self.assertEqual(self.cache.invalidate("Tux", 4), 0)
+        self.assertEqual(self.cache.invalidate("Tux", 5), 0)
+        self.assertEqual(self.cache.get("Tux"), "v5")
+
+        self.assertEqual(self.cache.invalidate("Tux", 6), 1)
+        self.assertEqual(self.cache.get("Tux"), -1)
+        # The stale item keeps its version until it is revalidated or replaced
+        self.assertEqual(self.cache.version_of("Tux"), 5)
+        self.assertEqual(self.cache.stats()["invalidations"], 1)
+
+    def test_invalidation_without_a_version_removes_the_item(self):
+        self.cache.put("Tux", "v5", 5)
+        self.cache.invalidate("Tux")
+        self.assertIsNone(self.cache.version_of("Tux"))
+        self.assertEqual(self.cache.get("Tux"), -1)
+        self.assertEqual(self.cache.invalidate("Fox", 1), -1)
+
+    def test_update_only_applies_newer_versions_to_cached_items(self):
+        self.assertEqual(self.cache.update("Tux", "v5", 5), -1)
+        self.assertIsNone(self.cache.version_of("Tux"))
+
+        self.cache.put("Tux", "v5", 5)
+        self.assertEqual(self.cache.update("Tux", "v4", 4), 0)
+        self.assertEqual(self.cache.update("Tux", "v5 again", 5), 0)
+        self.assertEqual(self.cache.get("Tux"), "v5")
+        self.assertEqual(self.cache.update("Tux", "v7", 7), 1)
+        self.assertEqual(self.cache.get("Tux"), "v7")
+
+    def test_update_after_an_invalidation_makes_the_item_fresh(self):
+        self.cache.put("Tux", "v5", 5)
+        self.cache.invalidate("Tux", 6)
+        # The update of version 6 arrives after its invalidation, an older one is still ignored
+        self.assertEqual(self.cache.update("Tux", "v4", 4), 0)
+        self.assertEqual(self.cache.get("Tux"), -1)
+        self.assertEqual(self.cache.update("Tux", "v6", 6), 1)
+        self.assertEqual(self.cache.get("Tux"), "v6")
+
+    def test_revalidate_needs_the_cached_version(self):
+        self.cache.put("Tux", "v5", 5)
+        self.cache.invalidate("Tux", 6)
+        self.assertEqual(self.cache.revalidate("Tux", 6), -1)
+        self.assertEqual(self.cache.get("Tux"), -1)
+        self.assertEqual(self.cache.revalidate("Tux", 5), "v5")
+        self.assertEqual(self.cache.get("Tux"), "v5")
+        self.assertEqual(self.cache.revalidate("Fox", 1), -1)
+
+    def test_concurrent_puts_keep_the_newest_version(self):
+        versions = list(range(1, 201))
+
+        # Responses for the same toy arrive in every order, the newest one wins
+        def put(offset):
+            for version in versions[offset::4] + versions[offset::4][::-1]:
+                self.cache.put("Tux", f"v{version}", version)
+        threads = [threading.Thread(target=put, args=(offset,)) for offset in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.cache.version_of("Tux"), 200)
+        self.assertEqual(self.cache.get("Tux"), "v200")
+
+
+if __name__ == "__main__":
+    unittest.main()
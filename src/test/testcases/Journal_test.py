@@ -0,0 +1,115 @@
+import os
+import sys
+import time
+import tempfile
+import unittest
+
+# Import the catalog service from the source tree
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Catalog"))
+from catalog import CatalogServer
+
+
+# Catalog recovery from the last snapshot and the journal of the changes made after it
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.csv_file = os.path.join(self.directory.name, "catalog.csv")
+        with open(self.csv_file, "w", newline="") as file:
+            file.write("Toy Name,Quantity,Price\nTux,100,9.99\nFox,100,19.99\n")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    # Start a catalog on the files as a restarted process would, no restocking so quantities only change by orders
+    def start(self, snapshot_interval=3600):
+        catalog = CatalogServer(0, self.csv_file, False, snapshot_interval=snapshot_interval, restock_threshold=-1)
+        catalog.init_catalog()
+        return catalog
+
+    def quantities(self, catalog):
+        return {toy: catalog.lookup(toy)[1] for toy in ["Tux", "Fox"]}
+
+    def test_changes_are_replayed_after_a_restart(self):
+        catalog = self.start()
+        catalog.order("Tux", 5)
+        catalog.order_many([("Tux", 1), ("Fox", 2)])
+
+        self.assertEqual(self.quantities(self.start()), {"Tux": 94, "Fox": 98})
+
+    def test_snapshot_writes_the_csv_file_and_starts_a_new_journal(self):
+        catalog = self.start()
+        catalog.order("Fox", 3)
+        catalog.snapshot()
+
+        with open(self.csv_file) as file:
+            self.assertIn("Fox,97,19.99", file.read())
+        self.assertEqual(os.path.getsize(catalog.journal.journal_file), 0)
+        self.assertFalse(os.path.isfile(catalog.journal.rotated_file))
+        self.assertEqual(self.quantities(self.start()), {"Tux": 100, "Fox": 97})
+
+    def test_failed_snapshot_keeps_the_rotated_journal(self):
+        catalog = self.start()
+        write_snapshot = catalog.catalog.write_snapshot
+
+        def disk_full(rows):
+            raise OSError("No space left on device")
+        catalog.catalog.write_snapshot = disk_full
+
+        catalog.order("Tux", 5)
+        with self.assertRaises(OSError):
+            catalog.snapshot()
+        self.assertTrue(os.path.isfile(catalog.journal.rotated_file))
+
+        # Changes after the failed snapshot go to the new journal, a restart replays both
+        catalog.order("Tux", 2)
+        catalog.order("Fox", 1)
+        self.assertEqual(self.quantities(self.start()), {"Tux": 93, "Fox": 99})
+
+        # The next snapshot takes the records of both journals
+        catalog.order("Fox", 1)
+        with self.assertRaises(OSError):
+            catalog.snapshot()
+        catalog.catalog.write_snapshot = write_snapshot
+        catalog.snapshot()
+        self.assertFalse(os.path.isfile(catalog.journal.rotated_file))
+        with open(self.csv_file) as file:
+            snapshot = file.read()
+        self.assertIn("Tux,93,9.99", snapshot)
+        self.assertIn("Fox,98,19.99", snapshot)
+        self.assertEqual(self.quantities(self.start()), {"Tux": 93, "Fox": 98})
+
+    def test_torn_last_journal_line_is_skipped(self):
+        catalog = self.start()
+        catalog.order("Tux", 5)
+        # A crash in the middle of a write leaves part of a record behind
+        with open(catalog.journal.journal_file, "a") as file:
+            file.write("Fox,9")
+
+        self.assertEqual(self.quantities(self.start()), {"Tux": 95, "Fox": 100})
+
+    def test_snapshot_thread_survives_a_failed_snapshot(self):
+        catalog = self.start(snapshot_interval=0.05)
+        write_snapshot = catalog.catalog.write_snapshot
+        failures = []
+
+        def fail_once(rows):
+            if not failures:
+                failures.append(rows)
+                raise OSError("No space left on device")
+            write_snapshot(rows)
+        catalog.catalog.write_snapshot = fail_once
+
+        catalog.order("Tux", 5)
+        deadline = time.time() + 5
+        while time.time() < deadline and (not failures or os.path.isfile(catalog.journal.rotated_file)):
+            time.sleep(0.05)
+
+        self.assertEqual(len(failures), 1)
+        self.assertFalse(os.path.isfile(catalog.journal.rotated_file))
+        with open(self.csv_file) as file:
+            self.assertIn("Tux,95,9.99", file.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import os
+import sys
+import time
+import tempfile
+import threading
+import unittest
+
+# Import the catalog service from the source tree
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Catalog"))
+from catalog import CatalogServer
+
+
+# Holds of the order service on catalog stock: reserve, commit, release and expiry
+class ReservationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.csv_file = os.path.join(self.directory.name, "catalog.csv")
+        with open(self.csv_file, "w", newline="") as file:
+            file.write("Toy Name,Quantity,Price\nTux,100,9.99\nFox,100,19.99\n")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    # No restocking, so quantities only change by orders
+    def start(self, reservation_ttl=30, reservation_sweep_interval=3600):
+        catalog = CatalogServer(0, self.csv_file, False, snapshot_interval=3600, restock_threshold=-1,
+                                reservation_ttl=reservation_ttl, reservation_sweep_interval=reservation_sweep_interval)
+        catalog.init_catalog()
+        return catalog
+
+    # Stock on hand and stock that can still be ordered
+    def stock(self, catalog, toy):
+        return catalog.catalog.quantity(toy), catalog.lookup(toy)[1]
+
+    def test_reserve_holds_stock_without_ordering_it(self):
+        catalog = self.start()
+        reservation_id = catalog.reserve([("Tux", 30), ("Fox", 10), ("Tux", 5)])
+
+        self.assertNotEqual(reservation_id, -1)
+        self.assertEqual(self.stock(catalog, "Tux"), (100, 65))
+        self.assertEqual(self.stock(catalog, "Fox"), (100, 90))
+        # Held stock cannot be ordered by anyone else
+        self.assertEqual(catalog.order("Tux", 66), -1)
+
+    def test_reserve_is_all_or_nothing(self):
+        catalog = self.start()
+        self.assertEqual(catalog.reserve([("Tux", 10), ("Fox", 101)]), -1)
+        self.assertEqual(catalog.reserve([("Tux", 10), ("Unicorn", 1)]), -1)
+        self.assertEqual(catalog.reserve([("Tux", 0)]), -1)
+        self.assertEqual(catalog.held, {})
+        self.assertEqual(self.stock(catalog, "Tux"), (100, 100))
+
+    def test_commit_orders_the_held_stock_once(self):
+        catalog = self.start()
+        reservation_id = catalog.reserve([("Tux", 30), ("Fox", 10)])
+
+        ordered = catalog.commit(reservation_id)
+        self.assertEqual(sorted((item["name"], item["quantity"]) for item in ordered), [("Fox", 10), ("Tux", 30)])
+        self.assertEqual(self.stock(catalog, "Tux"), (70, 70))
+        self.assertEqual(catalog.held, {})
+        self.assertEqual(catalog.commit(reservation_id), -1)
+        self.assertEqual(catalog.release(reservation_id), -1)
+        # The commit is in the journal
+        self.assertEqual(self.stock(self.start(), "Fox"), (90, 90))
+
+    def test_release_gives_the_stock_back_once(self):
+        catalog = self.start()
+        reservation_id = catalog.reserve([("Tux", 30)])
+
+        self.assertEqual(catalog.release(reservation_id), 1)
+        self.assertEqual(self.stock(catalog, "Tux"), (100, 100))
+        self.assertEqual(catalog.release(reservation_id), -1)
+        self.assertEqual(catalog.commit(reservation_id), -1)
+        self.assertEqual(self.stock(catalog, "Tux"), (100, 100))
+
+    def test_expired_reservation_cannot_be_committed(self):
+        catalog = self.start(reservation_ttl=0.05)
+        reservation_id = catalog.reserve([("Tux", 30)])
+        time.sleep(0.1)
+
+        self.assertEqual(catalog.commit(reservation_id), -1)
+        self.assertEqual(self.stock(catalog, "Tux"), (100, 100))
+
+    def test_sweeper_releases_expired_reservations(self):
+        catalog = self.start(reservation_ttl=0.05, reservation_sweep_interval=0.02)
+        catalog.reserve([("Tux", 30)])
+        kept = catalog.reserve([("Fox", 10)], ttl=30)
+
+        deadline = time.time() + 5
+        while time.time() < deadline and "Tux" in catalog.held:
+            time.sleep(0.02)
+        self.assertEqual(self.stock(catalog, "Tux"), (100, 100))
+        self.assertEqual(self.stock(catalog, "Fox"), (100, 90))
+        self.assertNotEqual(catalog.commit(kept), -1)
+
+    def test_commit_release_and_expiry_race_settles_each_reservation_once(self):
+        catalog = self.start(reservation_ttl=0.02, reservation_sweep_interval=0.01)
+        reservation_ids = [catalog.reserve([("Tux", 1), ("Fox", 1)]) for _ in range(50)]
+        committed = []
+        committed_lock = threading.Lock()
+
+        # Every reservation is committed and released at the same time while the sweeper expires them
+        def settle(action):
+            for reservation_id in reservation_ids:
+                if action(reservation_id) not in (-1, 1):
+                    with committed_lock:
+                        committed.append(reservation_id)
+        threads = [threading.Thread(target=settle, args=(action,)) for action in [catalog.commit, catalog.release] * 4]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        time.sleep(0.1)
+
+        self.assertEqual(len(committed), len(set(committed)))
+        self.assertEqual(catalog.held, {})
+        self.assertEqual(self.stock(catalog, "Tux"), (100 - len(committed), 100 - len(committed)))
+        self.assertEqual(self.stock(catalog, "Fox"), (100 - len(committed), 100 - len(committed)))
+
+    def test_concurrent_reservations_do_not_oversell(self):
+        catalog = self.start()
+        reservation_ids = []
+        reservation_lock = threading.Lock()
+
+        def reserve():
+            reservation_id = catalog.reserve([("Tux", 7)])
+            with reservation_lock:
+                reservation_ids.append(reservation_id)
+        threads = [threading.Thread(target=reserve) for _ in range(30)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        held = [reservation_id for reservation_id in reservation_ids if reservation_id != -1]
+        self.assertEqual(len(held), 100 // 7)
+        self.assertEqual(self.stock(catalog, "Tux"), (100, 100 - 7 * len(held)))
+
+
+if __name__ == "__main__":
+    unittest.main()